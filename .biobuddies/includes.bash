@@ -424,9 +424,8 @@ gash() {
 }
 
 hs() {
-    : 'Helicopyter Synth'
-    local cona="${1:-all}"
-    python -m helicopyter --format_with="${INSH_TF:-terraform}" "$cona"
+    : 'Helicopyter Synth, given codenames, file paths, or affected:<git-ref>'
+    python -m helicopyter --format_with="${INSH_TF:-terraform}" "${@:-all}"
 }
 
 hta() {
@@ -0,0 +1,255 @@
+"""
+Time imports, each synthesis phase, and whole runs over synthetic deploy trees.
+
+Usage: python benchmark_helicopyter.py [--scale full] [--update_baseline]
+
+test_benchmark.py fails when a quick benchmark exceeds its baseline times its threshold, after
+scaling by how fast this machine runs a fixed calibration loop compared to the baseline's.
+"""
+
+# ruff: noqa: T201
+from collections.abc import Callable, Iterator
+from contextlib import redirect_stdout
+from io import StringIO
+from json import dumps, loads
+from os import environ
+from pathlib import Path
+from shutil import which
+from subprocess import DEVNULL, check_call
+from sys import executable
+from tempfile import TemporaryDirectory
+from timeit import Timer
+
+from tap import Tap
+
+from helicopyter import (
+    Block,
+    HeliStack,
+    check_format_output,
+    iter_hcl,
+    local,
+    quote,
+    registry,
+    resource,
+    terraform,
+    terraform_json,
+    tlocals,
+)
+from helicopyter.formatting import format_hcl
+from helicopyter.output import json_chunks, write_if_changed
+
+BASELINE = Path(__file__).with_name('benchmark_baseline.json')
+REPOSITORY = Path(__file__).parent
+SCALES = {
+    'quick': {'blocks': (1_000,), 'codenames': (1, 50), 'megabytes': (1,), 'pushes': (100,)},
+    'full': {
+        'blocks': (1_000, 10_000, 100_000),
+        'codenames': (1, 50, 500),
+        'megabytes': (1, 10),
+        'pushes': (1_000,),
+    },
+}
+# Shorter differences are mostly noise from the filesystem and scheduler
+RESOLUTION = 0.01  # seconds
+# Per codename in multisynth trees
+BLOCKS_PER_CODENAME = 100
+PUSHES_PER_CODENAME = 10
+BLOCK_DEPLOY = """from helicopyter import cona, local, resource, terraform, tlocals
+
+tlocals(cona=cona, envi=terraform.workspace)
+for index in range(%d):
+    resource.null_resource(f'this{index}')(triggers={'cona': local.cona, 'index': index})
+"""
+STACK_DEPLOY = """from cdktf_cdktf_provider_null.resource import Resource as NullResource
+
+from helicopyter import HeliStack
+
+
+def synth(stack: HeliStack) -> None:
+    for index in range(%d):
+        stack.push(NullResource, f'this{index}', triggers={'index': str(index)})
+"""
+
+
+def best(function: Callable[[], object], repeat: int = 5) -> float:
+    """Return the fewest seconds of repeat calls, which is the least disturbed by other load."""
+    return min(Timer(function).repeat(repeat=repeat, number=1))
+
+
+def calibrate() -> float:
+    return min(Timer('sorted(str(number) for number in range(100_000))').repeat(repeat=5, number=1))
+
+
+def register_blocks(count: int) -> None:
+    tlocals(cona='benchmark', envi=terraform.workspace)
+    for index in range(count):
+        resource.null_resource(f'this{index}')(triggers={'cona': local.cona, 'index': index})
+
+
+def time_import(statement: str) -> float:
+    return best(
+        lambda: check_call([executable, '-c', statement], cwd=REPOSITORY),  # noqa: S603
+        repeat=3,
+    )
+
+
+def time_references(count: int, reference: object) -> float:
+    return best(lambda: [reference.cona for _ in range(count)])  # type: ignore[attr-defined]
+
+
+def time_blocks(count: int) -> Iterator[tuple[str, float]]:
+    yield f'register_{count}', best(lambda: (register_blocks(count), registry.clear()), repeat=3)
+    rows = [{'name': f'this{index}', 'triggers': {'index': index}} for index in range(count)]
+    yield (
+        f'register_bulk_{count}',
+        best(
+            lambda: (
+                resource.null_resource.bulk(rows, defaults={'triggers': {'cona': local.cona}}),
+                registry.clear(),
+            ),
+            repeat=3,
+        ),
+    )
+    register_blocks(count)
+    unformatted = ''.join(iter_hcl(registry.top_level()))
+    yield f'to_hcl_{count}', best(lambda: ''.join(iter_hcl(registry.top_level())))
+    dictionary = terraform_json(registry.top_level())
+    registry.clear()
+    yield f'to_json_{count}', best(lambda: ''.join(json_chunks(dictionary)))
+    yield f'to_json_minified_{count}', best(lambda: ''.join(json_chunks(dictionary, minify=True)))
+    yield f'format_builtin_{count}', best(lambda: format_hcl(unformatted))
+    for binary in ('terraform', 'tofu'):
+        if which(binary):
+            yield (
+                f'format_{binary}_{count}',
+                best(lambda: check_format_output(binary, '-', unformatted=unformatted)),  # noqa: B023
+            )
+    formatted = format_hcl(unformatted)
+    with TemporaryDirectory() as directory:
+        path = Path(directory) / 'main.tf'
+        yield (
+            f'write_changed_{count}',
+            best(lambda: (path.unlink(missing_ok=True), write_if_changed(path, [formatted]))),
+        )
+        yield f'write_unchanged_{count}', best(lambda: write_if_changed(path, [formatted]))
+
+
+def time_literals(megabytes: int) -> Iterator[tuple[str, float]]:
+    """Time quoting policy documents and allowlists as large as those embedded in deploys."""
+    statement = {'Action': 's3:GetObject', 'Effect': 'Allow', 'Resource': 'arn:aws:s3:::b/*'}
+    policy = dumps({'Statement': [statement] * (megabytes * 2**20 // 100)}, indent=2) + '\n'
+    yield f'literal_heredoc_{megabytes}mb', best(lambda: quote(policy))
+    yield f'literal_quoted_{megabytes}mb', best(lambda: quote(policy.rstrip()))
+    cidrs = [f'10.{index // 256 % 256}.{index % 256}.0/24' for index in range(megabytes * 2**16)]
+    yield f'literal_list_{megabytes}mb', best(lambda: quote(cidrs))
+
+
+def time_stack(count: int) -> Iterator[tuple[str, float]]:
+    from cdktf_cdktf_provider_null.resource import Resource as NullResource  # noqa: PLC0415
+
+    stack = HeliStack('benchmark')
+    with redirect_stdout(StringIO()):
+        seconds = best(
+            lambda: [
+                stack.push(NullResource, f'this{index}', triggers={'index': str(index)})
+                for index in range(count)
+            ],
+            repeat=1,
+        )
+    yield f'push_{count}', seconds
+    yield f'to_hcl_terraform_{count}', best(stack.to_hcl_terraform, repeat=3)
+
+
+def time_multisynth(style: str, codenames: int) -> float:
+    """Time `python -m helicopyter all` over a generated tree, from interpreter start to exit."""
+    deploy = (
+        BLOCK_DEPLOY % BLOCKS_PER_CODENAME
+        if style == 'blocks'
+        else STACK_DEPLOY % PUSHES_PER_CODENAME
+    )
+    with TemporaryDirectory() as directory:
+        # Shadow this repository's deploys package, which PYTHONPATH exposes with helicopyter
+        (Path(directory) / 'deploys').mkdir()
+        (Path(directory) / 'deploys' / '__init__.py').touch()
+        for index in range(codenames):
+            main = Path(directory) / 'deploys' / f'cona{index}' / 'terraform' / 'main.py'
+            main.parent.mkdir(parents=True)
+            main.write_text(deploy)
+        command = [executable, '-m', 'helicopyter', '--format_with', 'builtin', 'all']
+        return best(
+            lambda: check_call(  # noqa: S603
+                command,
+                cwd=directory,
+                env=environ | {'PYTHONPATH': str(REPOSITORY)},
+                stdout=DEVNULL,
+            ),
+            repeat=1,
+        )
+
+
+def run(scale: str) -> Iterator[tuple[str, float]]:
+    """Yield (name, seconds) for each benchmark at scale."""
+    yield 'import_blocks', time_import('from helicopyter import resource')
+    yield 'import_stack', time_import('from helicopyter import HeliStack')
+    yield 'references_block_100000', time_references(100_000, Block('local'))
+    yield 'references_interned_100000', time_references(100_000, local)
+    for count in SCALES[scale]['blocks']:
+        yield from time_blocks(count)
+    for megabytes in SCALES[scale]['megabytes']:
+        yield from time_literals(megabytes)
+    for count in SCALES[scale]['pushes']:
+        yield from time_stack(count)
+    for style in ('blocks', 'stacks'):
+        for codenames in SCALES[scale]['codenames']:
+            yield f'multisynth_{style}_{codenames}', time_multisynth(style, codenames)
+
+
+def compare(name: str, seconds: float, baseline: dict, calibration: float) -> str | None:
+    """Return a message if seconds exceeds the baseline, scaled to this machine, times threshold."""
+    if name not in baseline['benchmarks']:
+        return None
+    expected = baseline['benchmarks'][name]
+    allowed = (
+        expected['seconds'] * calibration / baseline['calibration'] * expected['threshold']
+        + RESOLUTION
+    )
+    return f'{name} took {seconds:.3f} s; allowed {allowed:.3f} s' if seconds > allowed else None
+
+
+class Arguments(Tap):
+    scale: str = 'quick'  # quick, or full for 10k and 100k blocks and 500 codenames
+    update_baseline: bool = False  # Record results, keeping thresholds, as the new baseline
+
+
+def main() -> None:
+    arguments = Arguments().parse_args()
+    baseline = loads(BASELINE.read_text()) if BASELINE.exists() else {'benchmarks': {}}
+    calibration = calibrate()
+    results = {}
+    for name, seconds in run(arguments.scale):
+        results[name] = seconds
+        expected = baseline['benchmarks'].get(name, {}).get('seconds')
+        print(f'{name:<32} {seconds:9.4f} s {f"{expected:9.4f} s" if expected else ""}')
+    if arguments.update_baseline:
+        BASELINE.write_text(
+            dumps(
+                {
+                    'calibration': calibration,
+                    'benchmarks': baseline['benchmarks']
+                    | {
+                        name: {
+                            'seconds': seconds,
+                            'threshold': baseline['benchmarks'].get(name, {}).get('threshold', 3),
+                        }
+                        for name, seconds in results.items()
+                    },
+                },
+                indent=4,
+                sort_keys=True,
+            )
+            + '\n'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -16,7 +16,10 @@ except ImportError:
 
 def synth(stack: BaseStack) -> None:
     stack.provide('github', owner='biobuddies')
-    for firstname_dot_lastname, (username, role) in mapping.items():
-        stack.push(
-            Membership, firstname_dot_lastname.replace('.', '_'), role=role, username=username
-        )
+    stack.push_many(
+        Membership,
+        (
+            {'id_': firstname_dot_lastname.replace('.', '_'), 'role': role, 'username': username}
+            for firstname_dot_lastname, (username, role) in mapping.items()
+        ),
+    )
@@ -1,7 +1,6 @@
 """Demonstrate a simple HeliStack synth function using CDKTF constructs."""
 
 from cdktf import LocalExecProvisioner, TerraformLocal, TerraformOutput, TerraformVariable
-from cdktf_cdktf_provider_null.resource import Resource as NullResource
 
 from helicopyter import HeliStack
 
@@ -15,8 +14,9 @@ def synth(stack: HeliStack) -> None:
     stack.push(TerraformLocal, 'cona', stack.cona)
     stack.push(TerraformLocal, 'envi', '${terraform.workspace}')
 
+    # Imports cdktf_cdktf_provider_null.resource only now, when first pushed
     stack.push(
-        NullResource,
+        'null.resource',
         'this',
         provisioners=[
             LocalExecProvisioner(
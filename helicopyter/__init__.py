@@ -1,45 +1,223 @@
 """Generate Hashicorp Configuration Language (HCL) or JSON from Python."""
 
-from collections.abc import Iterable
-from importlib import import_module
-from json import dumps
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from contextlib import nullcontext
+from importlib import import_module, reload
+from itertools import chain
 from os import environ
 from pathlib import Path
-from re import sub
+from re import search
 from shutil import which
 from subprocess import PIPE, CalledProcessError, check_output
-from typing import Any, TypeVar
+from sys import modules
+from tempfile import TemporaryDirectory
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, ClassVar, NoReturn
+
+from helicopyter.affected import affected_conas, changed_files
+from helicopyter.cache import fingerprint, is_fresh, read_manifest, record, write_manifest
+from helicopyter.formatting import format_lines
+from helicopyter.literals import escape, object_key, quoted, string_fragments
+from helicopyter.output import diff_if_changed, json_chunks, write_if_changed
+from helicopyter.profile import measure, phases, report, with_phases
+
+if TYPE_CHECKING:
+    from helicopyter.parameters import Parameters as Parameters
+    from helicopyter.stack import HeliStack as HeliStack
+
+LINE_WIDTH = 100
+# A fragment is text, or a generator of fragments for a nested value that walk() steps into
+Fragments = Iterator['str | Fragments']
+
+
+def walk(fragments: Fragments) -> Iterator[str]:
+    """Yield text depth-first with a stack of generators, so nesting is not limited by recursion."""
+    stack = [fragments]
+    while stack:
+        for fragment in stack[-1]:
+            if isinstance(fragment, str):
+                yield fragment
+            else:
+                stack.append(fragment)
+                break
+        else:
+            stack.pop()
 
-from cdktf import App, TerraformElement, TerraformStack
-from constructs import Construct, Node
-from tap import Tap
 
+def is_scalar(value: Any) -> bool:
+    return not isinstance(value, dict | list) and not (
+        isinstance(value, Block) and value.attributes
+    )
 
-registry: list['Block'] = []
 
+def fits_inline(items: list[Any], depth: int) -> bool:
+    """Whether items are scalars whose `[a, b]` form is roughly within LINE_WIDTH at depth."""
+    width = 2 * depth
+    for item in items:
+        if not is_scalar(item):
+            return False
+        # Quotes and ', ', ignoring escapes, which only matter near the limit
+        width += len(str(item)) + 4
+        if width > LINE_WIDTH:
+            return False
+    return True
 
-def quote(value: Any, depth: int = 1) -> str:
+
+def value_fragments(value: Any, depth: int, *, heredoc: bool = True) -> Fragments:
     if isinstance(value, Block):
-        return value.to_hcl(depth) if value.attributes else str(value)
+        yield block_fragments(value, depth) if value.attributes else str(value)
+    elif isinstance(value, Reference):
+        yield str(value)
+    elif isinstance(value, bool):
+        yield 'true' if value else 'false'
+    elif isinstance(value, dict):
+        pad = '  ' * (depth + 1)
+        yield '{\n'
+        for index, (key, item) in enumerate(value.items()):
+            yield f'\n{pad}{object_key(key)} = ' if index else f'{pad}{object_key(key)} = '
+            yield value_fragments(item, depth + 1)
+        yield f'\n{"  " * depth}}}'
+    elif isinstance(value, list):
+        yield list_fragments(value, depth)
+    else:
+        yield string_fragments(str(value), heredoc=heredoc)
+
+
+def list_fragments(items: list[Any], depth: int) -> Fragments:
+    """Yield short lists of scalars on one line, otherwise one item per line."""
+    if fits_inline(items, depth):
+        yield '['
+        for index, item in enumerate(items):
+            if index:
+                yield ', '
+            yield value_fragments(item, depth, heredoc=False)
+        yield ']'
+        return
+    pad = '  ' * (depth + 1)
+    yield '[\n'
+    for item in items:
+        # Skipping a generator per string matters for allowlists of thousands of entries
+        if type(item) is str:
+            yield f'{pad}"{escape(item)}",\n'
+        else:
+            yield pad
+            yield value_fragments(item, depth + 1, heredoc=False)
+            yield ',\n'
+    yield f'{"  " * depth}]'
+
+
+def block_fragments(block: 'Block', depth: int) -> Fragments:
+    pad = '  ' * depth
+    tags = (' ' + ' '.join(quoted(tag) for tag in block.labels)) if block.labels else ''
+    yield f'{pad}{block.kind}{tags} {{'
+    if not block.attributes:
+        yield '}'
+        return
+    for key, value in block.attributes.items():
+        if isinstance(value, Block) and value.attributes:
+            yield '\n'
+            yield block_fragments(value, depth + 1)
+        else:
+            yield f'\n{pad}  {key} = '
+            yield value_fragments(value, depth + 1)
+    yield f'\n{pad}}}'
+
+
+def iter_hcl(blocks: Iterable['Block']) -> Iterator[str]:
+    """Yield HCL for blocks, separated by blank lines, without building it as one string."""
+    for index, block in enumerate(blocks):
+        if index:
+            yield '\n\n'
+        yield from walk(block_fragments(block, 0))
+
+
+def quote(value: Any, depth: int = 1) -> str:
+    return ''.join(walk(value_fragments(value, depth)))
+
+
+def json_value(value: Any) -> Any:
+    """Return value in Terraform JSON syntax, where strings are templates like quote's."""
+    if isinstance(value, Block) and value.attributes:
+        return value.to_json()
+    if isinstance(value, Block | Reference):
+        # Bare words like string are type constraints; anything else is an expression
+        return f'${{{value}}}' if '.' in str(value) else str(value)
     if isinstance(value, bool):
-        return 'true' if value else 'false'
+        return value
     if isinstance(value, dict):
-        pad = '  ' * (depth + 1)
-        close = '  ' * depth
-        inner = '\n'.join(f'{pad}{k} = {quote(v, depth + 1)}' for k, v in value.items())
-        return f'{{\n{inner}\n{close}}}'
+        return {str(key): json_value(item) for key, item in value.items()}
     if isinstance(value, list):
-        return f"[{', '.join(quote(v, depth) for v in value)}]"
-    return f'"{value}"'
+        return [json_value(item) for item in value]
+    return str(value)
+
+
+def nest(tree: dict[str, Any], path: Iterable[str], body: dict[str, Any]) -> None:
+    """Put body at path in tree, turning it into a list if another block is already there."""
+    *parents, leaf = path
+    for key in parents:
+        tree = tree.setdefault(key, {})
+    if leaf not in tree:
+        tree[leaf] = body
+    elif isinstance(tree[leaf], list):
+        tree[leaf].append(body)
+    else:
+        tree[leaf] = [tree[leaf], body]
+
+
+def terraform_json(blocks: Iterable['Block']) -> dict[str, Any]:
+    """Return blocks as a main.tf.json dictionary, without cdktf."""
+    tree: dict[str, Any] = {'//': {}}
+    for block in blocks:
+        if block.kind == 'locals':
+            tree.setdefault('locals', {}).update(block.to_json())
+        else:
+            nest(tree, (block.kind, *block.labels), block.to_json())
+    return tree
+
+
+class Reference:
+    """Interned, immutable, unquoted expression like local.cona; attribute access extends it."""
+
+    __slots__ = ('_address',)
+    interned: ClassVar[dict[str, 'Reference']] = {}
+
+    def __new__(cls, address: str) -> 'Reference':  # noqa: PYI034
+        """Return the one Reference for address."""
+        try:
+            return cls.interned[address]
+        except KeyError:
+            reference = super().__new__(cls)
+            object.__setattr__(reference, '_address', address)
+            return cls.interned.setdefault(address, reference)
+
+    def __getattr__(self, name: str) -> 'Reference':  # noqa: D105
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return Reference(f'{self._address}.{name}')
+
+    def __setattr__(self, name: str, value: Any) -> NoReturn:  # noqa: D105
+        raise AttributeError(f'{self} is immutable')
+
+    def __reduce__(self) -> tuple[type['Reference'], tuple[str]]:  # noqa: D105
+        return Reference, (self._address,)
+
+    def __repr__(self) -> str:  # noqa: D105
+        return f'Reference({self._address!r})'
+
+    def __str__(self) -> str:  # noqa: D105
+        return self._address
 
 
 class Block:
     """HCL block prototype; each __call__ creates a new registered Block instance."""
 
+    __slots__ = ('attributes', 'children', 'kind', 'labels', 'parent')
+
     def __init__(self, kind: str, *labels: str) -> None:
-        self.kind = kind
-        self.labels = labels
-        self.attributes = {}
+        object.__setattr__(self, 'kind', kind)
+        object.__setattr__(self, 'labels', labels)
+        object.__setattr__(self, 'attributes', {})
+        object.__setattr__(self, 'children', None)
 
     def __call__(self, *labels: str, **kwargs: Any) -> 'Block':
         if labels and not kwargs:
@@ -49,51 +227,192 @@ class Block:
             except AttributeError:
                 pass
             return child
-        if kwargs:
-            self.attributes = kwargs
         if labels:
             self.labels = (*self.labels, *labels)
-        if self not in registry:
-            registry.append(self)
+        registered = registry.add(self, kwargs)
         try:
-            parent = object.__getattribute__(self, 'parent')
-            parent.attributes[self.kind] = self
-            if parent not in registry:
-                registry.append(parent)
+            registry.adopt(object.__getattribute__(self, 'parent'), registered)
         except AttributeError:
             pass
-        return self
+        return registered
+
+    def bulk(
+        self,
+        rows: Iterable[Mapping[str, Any]],
+        label_key: str = 'name',
+        defaults: Mapping[str, Any] | None = None,
+        *,
+        keep_label_key: bool = True,
+    ) -> list['Block']:
+        """
+        Register a block per row, labelled by row[label_key], with defaults under each row.
+
+        Like `self(row[label_key])(**defaults, **row)` for each row, in one registry pass. Given
+        keep_label_key=False, row[label_key] is only a label, like HeliStack.push_many's id_key.
+        Nested blocks like terraform.backend, whose labels are not arguments, always drop it.
+
+        Example usage:
+        resource.github_repository.bulk(rows, defaults={'has_wiki': False})
+        """
+        shared = dict(defaults or {})
+        try:
+            object.__getattribute__(self, 'parent')
+        except AttributeError:
+            pass
+        else:
+            # Nested blocks like terraform.backend register through their parent
+            nested = []
+            for row in rows:
+                attributes = shared | row
+                nested.append(self(attributes.pop(label_key))(**attributes))
+            return nested
+        blocks = []
+        for row in rows:
+            attributes = shared | row
+            label = attributes[label_key] if keep_label_key else attributes.pop(label_key)
+            block = Block(self.kind, *self.labels, label)
+            object.__setattr__(block, 'attributes', attributes)
+            blocks.append(block)
+        return registry.extend(blocks)
 
     def __getattr__(self, name: str) -> 'Block':
+        if name.startswith('__'):
+            raise AttributeError(name)
+        children = object.__getattribute__(self, 'children')
+        if children and name in children:
+            return children[name]
         return Block(self.kind, *self.labels, name)
 
     def __setattr__(self, name: str, value: Any) -> None:
+        if name in Block.__slots__:
+            object.__setattr__(self, name, value)
+            return
+        # Other names, like terraform.backend, are nested block prototypes
         if isinstance(value, Block):
             object.__setattr__(value, 'parent', self)
-        object.__setattr__(self, name, value)
+        if self.children is None:
+            object.__setattr__(self, 'children', {})
+        self.children[name] = value
 
     def __str__(self) -> str:
         return '.'.join([self.kind, *self.labels])
 
     def to_hcl(self, depth: int = 0) -> str:
-        pad = '  ' * depth
-        tags = (' ' + ' '.join(f'"{tag}"' for tag in self.labels)) if self.labels else ''
-        head = f'{pad}{self.kind}{tags} {{'
-        if not self.attributes:
-            return f'{head}}}'
-        parts = []
+        return ''.join(walk(block_fragments(self, depth)))
+
+    def to_json(self) -> dict[str, Any]:
+        """Return the body in Terraform JSON syntax, nesting child blocks under their labels."""
+        body: dict[str, Any] = {}
         for key, value in self.attributes.items():
             if isinstance(value, Block) and value.attributes:
-                parts.append(value.to_hcl(depth + 1))
+                nest(body, (key, *value.labels), value.to_json())
+            elif self.kind == 'moved':
+                # Addresses, which Terraform JSON reads as bare references rather than templates
+                body[key] = str(value)
             else:
-                parts.append(f'{pad}  {key} = {quote(value, depth + 1)}')
-        return f'{head}\n{'\n'.join(parts)}\n{pad}}}'
+                body[key] = json_value(value)
+        return body
+
+
+# Terraform allows one block per address of these kinds, so repeats merge
+ADDRESSED_KINDS = frozenset(
+    {'data', 'locals', 'module', 'output', 'provider', 'resource', 'terraform', 'variable'}
+)
+
+
+class Registry:
+    """Blocks in registration order, keyed by address or, for kinds like moved, identity."""
+
+    def __init__(self) -> None:
+        self.blocks: dict[object, Block] = {}
+        self.children: set[int] = set()
+        self.links: list[tuple[Block, str]] = []
+
+    def __contains__(self, block: object) -> bool:  # noqa: D105
+        return isinstance(block, Block) and self.blocks.get(self.key(block)) is block
+
+    def __iter__(self) -> Iterator[Block]:  # noqa: D105
+        return iter(self.blocks.values())
+
+    def __len__(self) -> int:  # noqa: D105
+        return len(self.blocks)
+
+    def key(self, block: Block) -> object:
+        """Return the address of block, nested under its parent's, or its identity."""
+        try:
+            return f'{self.key(object.__getattribute__(block, "parent"))}.{block}'
+        except AttributeError:
+            return self.top_level_key(block)
+
+    def top_level_key(self, block: Block) -> object:
+        """Return the address of a block without a parent, with any alias, or its identity."""
+        if block.kind not in ADDRESSED_KINDS:
+            return id(block)
+        alias = block.attributes.get('alias')
+        return f'{block}.{alias}' if alias else str(block)
+
+    def add(self, block: Block, attributes: dict[str, Any]) -> Block:
+        """Register block, merging attributes into any block already at the same address."""
+        if block in self:
+            block.attributes |= attributes
+        elif attributes:
+            block.attributes = attributes
+        registered = self.blocks.setdefault(self.key(block), block)
+        if registered is not block:
+            registered.attributes |= block.attributes
+        self.children.update(
+            id(value)
+            for value in registered.attributes.values()
+            if isinstance(value, Block) and value.attributes
+        )
+        return registered
+
+    def extend(self, blocks: Iterable[Block]) -> list[Block]:
+        """Register new, parentless blocks like add, returning the blocks now at their addresses."""
+        registered = []
+        for block in blocks:
+            existing = self.blocks.setdefault(self.top_level_key(block), block)
+            if existing is not block:
+                existing.attributes |= block.attributes
+            registered.append(existing)
+        self.children.update(
+            id(value)
+            for block in registered
+            for value in block.attributes.values()
+            if isinstance(value, Block) and value.attributes
+        )
+        return registered
+
+    def adopt(self, parent: Block, child: Block) -> None:
+        """Nest child in parent, registering parent; clear() undoes this on prototypes."""
+        if parent not in self:
+            # Forget what an earlier codename gave a prototype like terraform
+            parent.attributes = {}
+        parent.attributes[child.kind] = child
+        self.children.add(id(child))
+        self.links.append((parent, child.kind))
+        self.add(parent, {})
+
+    def top_level(self) -> list[Block]:
+        """Return blocks that are not nested in another block."""
+        return [block for block in self if id(block) not in self.children]
+
+    def clear(self) -> None:
+        """Forget every block and detach adopted children from their parents."""
+        for parent, kind in self.links:
+            parent.attributes.pop(kind, None)
+        self.blocks.clear()
+        self.children.clear()
+        self.links.clear()
+
+
+registry = Registry()
 
 
 # Unquoted type references
-tbool = Block('bool')  # noqa: A001
-number = Block('number')
-string = Block('string')
+tbool = Reference('bool')  # noqa: A001
+number = Reference('number')
+string = Reference('string')
 terraform = Block('terraform')
 terraform.required_providers = Block('required_providers')
 terraform.backend = Block('backend')
@@ -106,179 +425,419 @@ resource = Block('resource')
 variable = Block('variable')
 
 # Read-side references (e.g. local.cona, var.giha)
-local = Block('local')
-var = Block('var')
+local = Reference('local')
+var = Reference('var')
 
 cona: str = 'UNSET'
 environ['JSII_SILENCE_WARNING_UNTESTED_NODE_VERSION'] = '1'
 
 
-class HeliStack(TerraformStack):
-    def __init__(self, cona: str) -> None:
-        # Something is automatically creating outdir, which is cdktf.out by default
-        super().__init__(App(outdir='.'), cona)
+def __getattr__(name: str) -> Any:
+    """Import cdktf and tap, which start slowly, only when HeliStack or Parameters is used."""
+    if name == 'HeliStack':
+        return import_module('helicopyter.stack').HeliStack
+    if name == 'Parameters':
+        return import_module('helicopyter.parameters').Parameters
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
-        self.cona = cona
-        self._scopes: dict[str, Construct] = {}
 
-    def _allocate_logical_id(self, tf_element: Node | TerraformElement) -> str:
-        if isinstance(tf_element, Node):
-            # Mostly for mypy. Patches to support AWS CDK welcome.
-            raise TypeError('AWS CDK unsupported; please use CDKTF')  # pragma:no cover
-        return tf_element.node.id
+# ruff: noqa: T201
+def check_format_output(format_with: str, *args: str, unformatted: str = '') -> str:
+    """Return `{format_with} fmt ...` output, printing diagnostics on failure."""
+    try:
+        return check_output(  # noqa: S603
+            [format_with, 'fmt', *args], input=unformatted.encode(), stderr=PIPE
+        ).decode()
+    except CalledProcessError as error:
+        print(f'which {format_with}: {which(format_with)}')
+        print(f'{format_with} fmt stderr: {error.stderr}')
+        print(
+            f'{format_with} --version: {check_output([format_with, "--version"], stderr=PIPE)}'
+        )  # noqa: S603
+        raise
+
+
+def split_lines(chunks: Iterable[str]) -> Iterator[str]:
+    """Regroup chunks of text into lines without their newlines."""
+    partial = ''
+    for chunk in chunks:
+        *complete, rest = (partial + chunk).split('\n')
+        yield from complete
+        partial = rest
+    yield partial
+
+
+def heredoc_lines(lines: Iterable[str]) -> Iterator[str]:
+    """Yield lines, joining each heredoc's contents and closing delimiter to its opening line."""
+    delimiter = ''
+    held: list[str] = []
+    for line in lines:
+        if delimiter:
+            held.append(line)
+            if line.strip() == delimiter:
+                yield '\n'.join(held)
+                delimiter, held = '', []
+        elif heredoc := search(r'<<-?([A-Za-z_][\w-]*)$', line.rstrip()):
+            delimiter, held = heredoc[1], [line]
+        else:
+            yield line
+    if held:
+        yield '\n'.join(held)
+
+
+def tidy(chunks: Iterable[str]) -> Iterator[str]:
+    """
+    Yield lines without two blank lines in a row, between closing braces, or at either end.
+
+    Also separates a resource from a preceding closing brace with a blank line. Heredoc contents,
+    like scripts with blank lines of their own, pass through untouched.
+    """
+    previous = None
+    # Lines since previous that are empty or whitespace, and whether previous's } was consumed
+    between: list[str] = []
+    closed = False
+    for line in heredoc_lines(split_lines(chunks)):
+        if not line.strip():
+            between.append(line)
+            continue
+        if previous is None:
+            previous = line.lstrip()
+            between = []
+            continue
+        yield previous + '\n'
+        unconsumed, closed = not closed, False
+        if previous.endswith('}') and unconsumed and between == ['', ''] and line.startswith('}'):
+            between = []
+            closed = line == '}'
+        elif previous.endswith('}') and not between and line.startswith('resource'):
+            between = ['']
+        for index, blank in enumerate(between):
+            if blank or not index or between[index - 1]:
+                yield blank + '\n'
+        previous = line
+        between = []
+    yield ('' if previous is None else previous.rstrip()) + '\n'
+
+
+def autoformat(unformatted: Iterable[str], format_with: str) -> Iterator[str]:
+    """Format with the builtin formatter or `{format_with} fmt -`, then tidy blank lines."""
+    if format_with == 'builtin':
+        return tidy(format_lines(split_lines(unformatted)))
+    return tidy([check_format_output(format_with, '-', unformatted=''.join(unformatted))])
+
+
+def format_staged(
+    staging_directory: Path, format_with: str, top_directory: Path
+) -> dict[str, bool]:
+    """Format every staged main.tf with one subprocess; return whether each output changed."""
+    check_format_output(format_with, '-recursive', str(staging_directory))
+    written = {}
+    for staged in staging_directory.glob('deploys/*/terraform/**/main.tf'):
+        relative_path = staged.relative_to(staging_directory)
+        with staged.open() as lines:
+            written[str(relative_path)] = write_if_changed(
+                top_directory / relative_path, tidy(lines)
+            )
+    return written
 
-    def override(self, **kwargs: Any) -> None:
-        """Call add_override for each keyword argument."""
-        for key, value in kwargs.items():
-            self.add_override(key, value)
 
-    def provide(self, name: str, **kwargs: Any) -> type[TerraformElement]:
-        """
-        Return a Provider class instance given its short name.
+def check_if_changed(path: Path, chunks: Iterable[str], name: str) -> bool:
+    """Print a unified diff from path to chunks, labelled with name; return whether there is one."""
+    diff = diff_if_changed(path, chunks, name)
+    print(''.join(diff), end='')
+    return bool(diff)
 
-        Example usage:
-        stack.provide('github', owner='biobuddies')
-        """
-        module = import_module(f'cdktf_cdktf_provider_{name}.provider')
-        return getattr(module, f'{name.title()}Provider')(self, 'this', **kwargs)
 
-    E = TypeVar('E', bound=TerraformElement)
+def codename(cona_or_path: str, top_directory: Path = Path()) -> str:
+    path_to_check = top_directory / cona_or_path
+    if (
+        path_to_check.exists()
+        and path_to_check.name == 'main.py'
+        and path_to_check.parent.name == 'terraform'
+    ):
+        return path_to_check.parent.parent.name
+    return cona_or_path
 
-    def push(
-        self,
-        Element: type[E],  # noqa: N803
-        id_: str,
-        *args: Any,
-        **kwargs: Any,
-    ) -> E:
-        """
-        Return new instance of Element (data, local, output, resource, or variable).
 
-        In contrast to running Element(...) standalone, the new instance will be named in the
-        traditional Terraform style.
+def select_conas(all_or_conas_or_paths: Iterable[str], top_directory: Path) -> list[str]:
+    """
+    Return codenames named directly, by main.py path, or by selectors.
 
-        Also assigns Element.__str__ to Element.to_string.
+    `all` selects every codename, `affected:<git-ref>` those whose inputs changed since git-ref,
+    and the path of any other Python file, like stacks/base.py, those importing it. Relative
+    paths are relative to top_directory.
+    """
+    every = sorted(
+        {
+            file.parent.parent.name
+            for file in (top_directory / 'deploys').glob('**/terraform/main.py')
+        }
+    )
+    if 'all' in all_or_conas_or_paths or 'helicopyter.py' in all_or_conas_or_paths:
+        return every
+    conas = set()
+    changed: set[Path] = set()
+    for cona_or_path in all_or_conas_or_paths:
+        if cona_or_path.startswith('affected:'):
+            changed |= changed_files(top_directory, cona_or_path.removeprefix('affected:'))
+        elif cona_or_path.endswith('.py') and codename(cona_or_path, top_directory) == cona_or_path:
+            changed.add((top_directory / cona_or_path).resolve())
+        else:
+            conas.add(codename(cona_or_path, top_directory))
+    return sorted(conas.union(affected_conas(top_directory, every, changed) if changed else ()))
 
-        Example usage:
-        from cdktf_cdktf_provider_cloudflare.zero_trust_access_application import (
-            ZeroTrustAccessApplication
-        )
-        stack.push(ZeroTrustAccessApplication, 'mydomain-wildcard', domain='*.mydomain.com')
-        """
-        # assignment: mypy thinks narrow type on one side and broad object type on the other are
-        # incompatible
-        # method-assign: mypy can't handle it https://github.com/python/mypy/issues/2427
-        Element.__str__ = Element.to_string  # type: ignore[assignment,method-assign]
 
-        if Element.__module__ == 'cdktf':
-            scope_name = Element.__name__.lower().replace('terraform', '')
+def render(
+    blocks: list[Block],
+    stack: 'HeliStack | None',
+    *,
+    hashicorp_configuration_language: bool,
+    settle: Callable[[Iterable[str]], Iterable[str]],
+    minify_json: bool = False,
+) -> Iterable[str]:
+    """
+    Return chunks of HCL or JSON for a HeliStack if given, then blocks.
+
+    Blocks registered by a deploy with a HeliStack join its output, so pushed elements can move
+    to Block, like generated helicopyter.bindings, one type at a time.
+    """
+    if not hashicorp_configuration_language:
+        dictionary = terraform_json(blocks)
+        if stack is not None:
+            dictionary = merge(stack.to_terraform(), dictionary)
+        dictionary['//']['AUTOGENERATED'] = 'by helicopyter'
+        return chain(settle(json_chunks(dictionary, minify=minify_json)), ['\n'])
+    return chain(
+        ['# AUTOGENERATED by helicopyter\n\n'],
+        [] if stack is None else [stack.to_hcl_terraform()['hcl'], '\n\n' if blocks else ''],
+        settle(iter_hcl(blocks)),
+    )
+
+
+def merge(tree: dict[str, Any], other: Mapping[str, Any]) -> dict[str, Any]:
+    """Return tree with other's values added, merging dictionaries present in both."""
+    for key, value in other.items():
+        if isinstance(value, Mapping) and isinstance(tree.get(key), dict):
+            merge(tree[key], value)
         else:
-            scope_name = Element.__module__.replace('cdktf_cdktf_provider_', '').replace('.', '_')
-        if scope_name not in self._scopes:
-            self._scopes[scope_name] = Construct(self, scope_name)
+            tree[key] = value
+    return tree
 
-        print(f'Pushing {scope_name}.{id_}')
-        return Element(self._scopes[scope_name], id_, *args, **kwargs)
 
+def synth_stack(main: ModuleType, module_path: str) -> 'HeliStack':
+    """Return the HeliStack that main.synth filled in."""
+    try:
+        stack_class = main.synth.__annotations__['stack']
+        stack = stack_class(cona)
+        main.synth(stack)
+    except (AttributeError, KeyError, TypeError):
+        python_file = module_path.replace('.', '/') + '.py'
+        print(f'`def synth(stack: HeliStack):` appears to be missing from {python_file}')
+        raise
+    return stack
 
-# ruff: noqa: T201
-def multisynth(
+
+def synthesize(  # noqa: PLR0913
+    cona_or_path: str,
+    *,
+    format_with: str,
+    hashicorp_configuration_language: bool,
+    top_directory: Path,
+    check: bool = False,
+    compact: bool = False,
+    minify_json: bool = False,
+    profile: bool = False,
+    staging_directory: Path | None = None,
+) -> dict[str, bool]:
+    """
+    Generate one codename's HCL or JSON; return whether each file, by relative path, changed.
+
+    Given staging_directory, unformatted HCL is left there for format_staged instead. Given
+    profile, each phase is measured into helicopyter.profile.phases. Given compact, similar
+    resource blocks of Block deploys share one for_each block. Block deploys defining `shard` are
+    split by helicopyter.sharding into main.tf and a file per shard. Given minify_json, JSON has no
+    whitespace. Given check, nothing is written: a unified diff is printed for each file that would
+    change.
+    """
+    global cona
+    cona = codename(cona_or_path)
+    module_path = f'deploys.{cona}.terraform.main'
+    # Forget blocks left by a codename that failed before rendering, as in a reused worker
+    registry.clear()
+    phase = measure if profile else lambda *_: nullcontext({})
+    # Profiling finishes each streamed phase before the next so time is not misattributed
+    settle = list if profile else iter
+    with phase(cona, 'import') as entry:
+        try:
+            # Pure Block deploys register blocks as they run, so run them again if imported
+            main = (
+                reload(modules[module_path])
+                if module_path in modules
+                else import_module(module_path)
+            )
+        except ImportError:
+            python_file = module_path.replace('.', '/') + '.py'
+            print(f'`def synth(stack: HeliStack):` appears to be missing from {python_file}')
+            raise
+        entry['blocks'] = len(registry)
+    stack = None
+    if hasattr(main, 'synth'):
+        with phase(cona, 'synth') as entry:
+            stack = synth_stack(main, module_path)
+            entry['imports'] = stack.imports
+            entry['pushes'] = stack.pushes
+    suffix = '' if hashicorp_configuration_language else '.json'
+    try:
+        with phase(cona, 'render'):
+            blocks = registry.top_level()
+            if compact:
+                blocks = import_module('helicopyter.compact').compact(blocks)
+            # Shards other than main.tf's are written to terraform/{shard}/
+            shards = (
+                import_module('helicopyter.sharding').split(blocks, main.shard, cona)
+                if hasattr(main, 'shard') and not hasattr(main, 'synth')
+                else {'': blocks}
+            )
+            files = {
+                f'deploys/{cona}/terraform/{shard}{"/" if shard else ""}main.tf{suffix}': render(
+                    shard_blocks,
+                    stack,
+                    hashicorp_configuration_language=hashicorp_configuration_language,
+                    minify_json=minify_json,
+                    settle=settle,
+                )
+                for shard, shard_blocks in shards.items()
+            }
+        written = {}
+        for path, chunks in files.items():
+            print(f'{"Checking" if check else "Generating"} {path}')
+            if hashicorp_configuration_language and staging_directory:
+                with phase(cona, 'write'):
+                    (staging_directory / path).parent.mkdir(parents=True, exist_ok=True)
+                    with (staging_directory / path).open('w') as file:
+                        file.writelines(chunks)
+                written[path] = False
+                continue
+            formatted = chunks
+            if hashicorp_configuration_language:
+                with phase(cona, 'format'):
+                    formatted = settle(autoformat(chunks, format_with))
+            with phase(cona, 'check' if check else 'write'):
+                written[path] = (
+                    check_if_changed(top_directory / path, formatted, path)
+                    if check
+                    else write_if_changed(top_directory / path, formatted)
+                )
+        return written
+    finally:
+        # Clearing detaches children from prototypes, so only after the body is consumed
+        registry.clear()
+
+
+def multisynth(  # noqa: PLR0913
     all_or_conas_or_paths: Iterable[str],
     *,
     change_directory: Path | None,
     hashicorp_configuration_language: bool,
     format_with: str,
-) -> None:
-    """Generate Hashicorp Configuration Language (HCL) or JSON."""
-    global cona
+    batch_format: bool = False,
+    cache: bool = False,
+    check: bool = False,
+    compact: bool = False,
+    jobs: int = 1,
+    minify_json: bool = False,
+    profile: Path | None = None,
+) -> int:
+    """
+    Generate Hashicorp Configuration Language (HCL) or JSON; return how many files changed.
+
+    Given check, leave the working tree alone and return how many files are out of date.
+    """
     if not all_or_conas_or_paths:
         print('No codenames specified. Doing nothing.')
-        return
+        return 0
 
     top_directory = change_directory or Path.cwd()
-
-    if 'all' in all_or_conas_or_paths or 'helicopyter.py' in all_or_conas_or_paths:
-        conas_or_paths = {
-            file.parent.parent.name
-            for file in (top_directory / 'deploys').glob('**/terraform/main.py')
+    conas = select_conas(all_or_conas_or_paths, top_directory)
+    options = {
+        'compact': compact,
+        'format_with': format_with,
+        'hashicorp_configuration_language': hashicorp_configuration_language,
+        'minify_json': minify_json,
+        'top_directory': top_directory,
+    }
+    manifest = read_manifest(top_directory) if cache else {}
+    fingerprints = {cona: fingerprint(top_directory, cona, options) for cona in conas if cache}
+    stale_conas = [
+        cona
+        for cona in conas
+        if not (cache and is_fresh(top_directory, manifest.get(cona), fingerprints[cona]))
+    ]
+    if len(stale_conas) < len(conas):
+        print(f'Skipping {len(conas) - len(stale_conas)} codenames unchanged since cached')
+
+    with TemporaryDirectory(prefix='helicopyter-') as staging:
+        staging_directory = (
+            Path(staging) if batch_format and format_with != 'builtin' and not check else None
+        )
+        staging_options = options | {
+            'check': check,
+            'profile': bool(profile),
+            'staging_directory': staging_directory,
         }
-    else:
-        conas_or_paths = set(all_or_conas_or_paths)
-
-    for cona_or_path in conas_or_paths:
-        path_to_check = Path(cona_or_path)
-        if (
-            path_to_check.exists()
-            and path_to_check.name == 'main.py'
-            and path_to_check.parent.name == 'terraform'
-        ):
-            cona = path_to_check.parent.parent.name
+        phases.clear()
+        if jobs == 1:
+            results = {cona: synthesize(cona, **staging_options) for cona in stale_conas}
+            errors = []
         else:
-            cona = cona_or_path
-        module_path = f'deploys.{cona}.terraform.main'
-        try:
-            main = import_module(module_path)
-        except ImportError:
-            python_file = module_path.replace('.', '/') + '.py'
-            print(f'`def synth(stack: HeliStack):` appears to be missing from {python_file}')
-            raise
-        if not hasattr(main, 'synth'):
-            hashicorp_configuration_language = True
-            children = {
-                id(value)
-                for block in registry
-                for value in block.attributes.values()
-                if isinstance(value, Block) and value.attributes
+            results, errors = synthesize_in_parallel(stale_conas, jobs, staging_options)
+        if staging_directory:
+            with measure('all', 'format') if profile else nullcontext():
+                formatted = format_staged(staging_directory, format_with, top_directory)
+            results = {
+                cona: {path: formatted.get(path, changed) for path, changed in files.items()}
+                for cona, files in results.items()
             }
-            top_level = [block for block in registry if id(block) not in children]
-            unformatted_body = '\n\n'.join(block.to_hcl() for block in top_level)
-            registry.clear()
-        if hasattr(main, 'synth'):
-            try:
-                stack = main.synth.__annotations__['stack'](cona)
-                main.synth(stack)
-            except (AttributeError, KeyError, TypeError):
-                python_file = module_path.replace('.', '/') + '.py'
-                print(f'`def synth(stack: HeliStack):` appears to be missing from {python_file}')
-                raise
-            unformatted_body = stack.to_hcl_terraform()['hcl']
-        relative_path = (
-            f'deploys/{cona}/terraform/main.tf{"" if hashicorp_configuration_language else ".json"}'
+    written = sum(sum(files.values()) for files in results.values())
+    unchanged = sum(len(files) for files in results.values()) - written
+    if check:
+        print(f'{written} files out of date; {unchanged} up to date')
+    else:
+        print(f'Wrote {written} files; {unchanged} unchanged')
+    if cache and not check:
+        write_manifest(
+            top_directory,
+            manifest
+            | {
+                cona: record(top_directory, fingerprints[cona], files)
+                for cona, files in results.items()
+            },
         )
-        print(f'Generating {relative_path}')
-        if hashicorp_configuration_language:
-            unformatted = '# AUTOGENERATED by helicopyter\n\n' + unformatted_body
-            try:
-                autoformatted = check_output(  # noqa: S603
-                    [format_with, 'fmt', '-'], input=unformatted.encode(), stderr=PIPE
-                ).decode()
-            except CalledProcessError as error:
-                print(f'which {format_with}: {which(format_with)}')
-                print(f'{format_with} fmt stderr: {error.stderr}')
-                print(
-                    f'{format_with} --version: {check_output([format_with, "--version"], stderr=PIPE)}'
-                )  # noqa: S603
-                raise
-            formatted = sub(
-                r'\n{3,}',
-                '\n\n',
-                autoformatted.replace('}\n\n\n}', '}\n}').replace('}\nresource', '}\n\nresource'),
-            )
-            (top_directory / relative_path).write_text(formatted.strip() + '\n')
+    if profile:
+        report(profile)
+    if errors:
+        raise ExceptionGroup(f'{len(errors)} of {len(stale_conas)} codenames failed', errors)
+    return written
+
+
+def synthesize_in_parallel(
+    conas: Iterable[str], jobs: int, options: Mapping[str, Any]
+) -> tuple[dict[str, dict[str, bool]], list[Exception]]:
+    """Return synthesize results and errors from spawned processes, each reused like jobs=1."""
+    # Imported only here, like cdktf, since most runs use one process
+    context = import_module('multiprocessing').get_context('spawn')
+    # Each worker imports cdktf and a provider once, however many codenames use them
+    with import_module('concurrent.futures').ProcessPoolExecutor(jobs, context) as executor:
+        futures = {
+            cona: executor.submit(with_phases, synthesize, cona, **options) for cona in conas
+        }
+    errors = []
+    results = {}
+    for cona, future in futures.items():
+        if error := future.exception():
+            error.add_note(f'while generating {cona}')
+            errors.append(error)
         else:
-            dictionary = stack.to_terraform()
-            dictionary['//']['AUTOGENERATED'] = 'by helicopyter'
-            (top_directory / relative_path).write_text(
-                dumps(dictionary, indent=4, sort_keys=True) + '\n'
-            )
-
-
-class Parameters(Tap):
-    conas: list[str]  # pyright:ignore[reportUninitializedInstanceVariable]
-    directory: Path | None = None
-    format_with: str = 'terraform'
-    hashicorp_configuration_language: bool = True
-
-    def configure(self) -> None:  # noqa: D102
-        self.add_argument('conas', help='space-separated COdeNAmes')
-        self.add_argument('-C', '--directory')  # Like make and tar
+            results[cona], worker_phases = future.result()
+            phases.extend(worker_phases)
+    return results, errors
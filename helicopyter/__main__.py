@@ -1,11 +1,55 @@
 """Generate Hashicorp Configuration Language (HCL) or JSON from Python."""
 
-from helicopyter import Parameters, multisynth
+from pathlib import Path
+from sys import argv
 
-args = Parameters().parse_args()
-multisynth(
-    args.conas,
-    change_directory=args.directory,
-    format_with=args.format_with,
-    hashicorp_configuration_language=args.hashicorp_configuration_language,
+from helicopyter import multisynth, select_conas
+from helicopyter.bindings import write_bindings
+from helicopyter.diff import compare
+from helicopyter.parameters import (
+    AffectedParameters,
+    BindingsParameters,
+    DiffParameters,
+    Parameters,
+    ServeParameters,
 )
+from helicopyter.serve import request, serve
+from helicopyter.watch import watch
+
+if argv[1:2] == ['affected']:
+    affected = AffectedParameters().parse_args(argv[2:])
+    for cona in select_conas([f'affected:{affected.ref}'], affected.directory or Path.cwd()):
+        print(cona)  # noqa: T201
+elif argv[1:2] == ['bindings']:
+    bindings = BindingsParameters().parse_args(argv[2:])
+    for path in write_bindings(bindings.schema, bindings.output):
+        print(f'Wrote {path}')  # noqa: T201
+elif argv[1:2] == ['diff']:
+    diff = DiffParameters().parse_args(argv[2:])
+    if compare(diff.old, diff.new):
+        raise SystemExit(1)
+elif argv[1:2] == ['serve']:
+    serve(ServeParameters().parse_args(argv[2:]).directory or Path.cwd())
+else:
+    args = Parameters().parse_args()
+    arguments = {
+        'all_or_conas_or_paths': args.conas,
+        'batch_format': args.batch_format,
+        'cache': args.cache,
+        'check': args.check,
+        'change_directory': args.directory,
+        'compact': args.compact,
+        'format_with': args.format_with,
+        'hashicorp_configuration_language': args.hashicorp_configuration_language,
+        'jobs': args.jobs,
+        'minify_json': args.minify_json,
+        'profile': args.profile,
+    }
+    if args.watch:
+        watch(**arguments)
+    # A running `python -m helicopyter serve` has cdktf and providers loaded already
+    elif (returncode := request(args.directory or Path.cwd(), arguments)) is None:
+        if multisynth(**arguments) and args.check:
+            raise SystemExit(1)
+    elif returncode:
+        raise SystemExit(returncode)
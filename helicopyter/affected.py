@@ -0,0 +1,42 @@
+"""Select the codenames whose deploy directory, or any local module they import, changed."""
+
+from collections.abc import Iterable
+from pathlib import Path
+from subprocess import check_output
+
+from helicopyter.dependencies import local_dependencies
+
+# Changes to helicopyter itself affect every codename
+PACKAGE = Path(__file__).parent
+
+
+def changed_files(top_directory: Path, ref: str) -> set[Path]:
+    """Return files differing from ref, committed or not, and untracked files."""
+
+    def git(*args: str) -> list[str]:
+        return check_output(['git', *args], cwd=top_directory, text=True).splitlines()  # noqa: S603
+
+    root = Path(git('rev-parse', '--show-toplevel')[0])
+    return {
+        root / name
+        for name in (
+            *git('diff', '--name-only', '--no-renames', ref, '--'),
+            *git('ls-files', '--exclude-standard', '--others', '--full-name'),
+        )
+    }
+
+
+def affected_conas(top_directory: Path, conas: Iterable[str], changed: set[Path]) -> list[str]:
+    """Return conas whose deploy directory or transitive local imports include a changed file."""
+    top_directory = top_directory.resolve()
+    if any(path.is_relative_to(PACKAGE) for path in changed):
+        return list(conas)
+    return [
+        cona
+        for cona in conas
+        if any(path.is_relative_to(top_directory / 'deploys' / cona) for path in changed)
+        or changed
+        & local_dependencies(
+            top_directory, top_directory / 'deploys' / cona / 'terraform' / 'main.py'
+        )
+    ]
@@ -0,0 +1,219 @@
+"""
+Generate typed Block classes from `terraform providers schema -json`, without cdktf or Node.js.
+
+Each provider becomes a module with a TypedDict of arguments and a TypedBlock per resource and
+data source type, collected under `resource` and `data` like helicopyter's own prototypes:
+
+    from bindings.cloudflare import resource
+
+    resource.cloudflare_workers_route.api(pattern='api.example.com/*', zone_id=local.zone_id)
+
+Unknown or missing arguments raise TypeError when called, and type checkers see them too.
+"""
+
+from collections.abc import Iterable, Iterator, Mapping
+from json import loads
+from keyword import iskeyword
+from pathlib import Path
+from re import findall
+from typing import Any, ClassVar, TypedDict
+
+from helicopyter import Block, Reference
+from helicopyter.output import write_if_changed
+
+# Any attribute can be an expression or template instead of a literal
+String = str | Block | Reference
+Number = float | String
+Bool = bool | String
+ANNOTATIONS = {'bool': 'Bool', 'number': 'Number', 'string': 'String'}
+
+
+class DataMeta(TypedDict, total=False):
+    count: Any
+    depends_on: Any
+    for_each: Any
+    lifecycle: Any
+    provider: Any
+
+
+class ResourceMeta(DataMeta, total=False):
+    connection: Any
+    provisioner: Any
+
+
+class TypedBlock(Block):
+    """Block prototype for one resource or data source type, checking attribute names."""
+
+    __slots__ = ()
+    KIND: ClassVar[str]
+    TYPE: ClassVar[str]
+    ARGUMENTS: ClassVar[type[DataMeta]] = DataMeta
+    # Arguments whose names are Python keywords, which TypedDict classes cannot declare
+    EXTRA: ClassVar[frozenset[str]] = frozenset()
+
+    def __init__(self, *labels: str) -> None:
+        super().__init__(self.KIND, self.TYPE, *labels)
+
+    def __getattr__(self, name: str) -> Any:  # noqa: D105
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return type(self)(*self.labels[1:], name)
+
+    def __call__(self, *labels: str, **kwargs: Any) -> Any:  # noqa: D102
+        if labels:
+            # Label a new instance, since resource and data share one prototype per type
+            block = type(self)(*self.labels[1:], *labels)
+            return block(**kwargs) if kwargs else block
+        self.check(kwargs)
+        return super().__call__(**kwargs)
+
+    def bulk(
+        self,
+        rows: Iterable[Mapping[str, Any]],
+        label_key: str = 'name',
+        defaults: Mapping[str, Any] | None = None,
+        *,
+        keep_label_key: bool = True,
+    ) -> list[Block]:
+        """Check each row's attributes, with defaults, then register it like Block.bulk."""
+        shared = dict(defaults or {})
+
+        def checked() -> Iterator[Mapping[str, Any]]:
+            for row in rows:
+                attributes = shared | row
+                if not keep_label_key:
+                    del attributes[label_key]
+                self.check(attributes)
+                yield row
+
+        return super().bulk(checked(), label_key, defaults, keep_label_key=keep_label_key)
+
+    def check(self, attributes: Mapping[str, Any]) -> None:
+        """Raise TypeError if attributes has names outside the schema or lacks required ones."""
+        required = self.ARGUMENTS.__required_keys__
+        unknown = attributes.keys() - required - self.ARGUMENTS.__optional_keys__ - self.EXTRA
+        if unknown:
+            raise TypeError(f'{self.TYPE} has no arguments {", ".join(sorted(unknown))}')
+        if missing := required - attributes.keys():
+            raise TypeError(f'{self.TYPE} requires arguments {", ".join(sorted(missing))}')
+
+
+def class_name(type_: str) -> str:
+    return ''.join(part[:1].upper() + part[1:] for part in type_.split('_'))
+
+
+def module_name(source: str) -> str:
+    """Return the module for a provider source, like cloudflare for .../cloudflare/cloudflare."""
+    return source.rsplit('/', 1)[-1].replace('-', '_')
+
+
+def argument_lines(block: Mapping[str, Any]) -> tuple[list[str], list[str]]:
+    """Return TypedDict field lines for settable attributes and nested blocks, and keywords."""
+    fields = {}
+    for name, attribute in block.get('attributes', {}).items():
+        if attribute.get('required') or attribute.get('optional'):
+            annotation = ANNOTATIONS.get(attribute.get('type'), 'Any')
+            fields[name] = f'Required[{annotation}]' if attribute.get('required') else annotation
+    for name, block_type in block.get('block_types', {}).items():
+        fields[name] = 'Required[Any]' if block_type.get('min_items') else 'Any'
+    keywords = sorted(name for name in fields if iskeyword(name) or not name.isidentifier())
+    lines = [f'    {name}: {fields[name]}' for name in sorted(fields) if name not in keywords]
+    return lines, keywords
+
+
+def type_source(kind: str, type_: str, schema: Mapping[str, Any]) -> str:
+    name = ('Data' if kind == 'data' else '') + class_name(type_)
+    meta = 'DataMeta' if kind == 'data' else 'ResourceMeta'
+    lines, keywords = argument_lines(schema['block'])
+    return '\n'.join(
+        [
+            f'class {name}Arguments({meta}, total=False):',
+            *(lines or ['    pass']),
+            '',
+            '',
+            f'class {name}(TypedBlock):',
+            f'    """{kind.title()} {type_}."""',
+            '',
+            '    __slots__ = ()',
+            f"    KIND = '{kind}'",
+            f"    TYPE = '{type_}'",
+            f'    ARGUMENTS = {name}Arguments',
+            *([f'    EXTRA = frozenset({(*keywords,)!r})'] if keywords else []),
+            '',
+            '    def __call__(  # type: ignore[override]',
+            f'        self, *labels: str, **kwargs: Unpack[{name}Arguments]',
+            '    ) -> Any:',
+            '        return super().__call__(*labels, **kwargs)',
+            '',
+        ]
+    )
+
+
+def namespace_source(kind: str, source: str, types: Iterable[str]) -> str:
+    prefix = 'Data' if kind == 'data' else ''
+    attributes = [f'    {type_} = {prefix}{class_name(type_)}()' for type_ in types]
+    return '\n'.join(
+        [
+            f'class {kind}:  # noqa: N801',
+            f'    """{kind.title()} types of {source}."""',
+            '',
+            *(attributes or ['    pass']),
+            '',
+        ]
+    )
+
+
+def provider_source(source: str, schema: Mapping[str, Any]) -> str:
+    """Return a module of TypedBlock classes for one provider's schema."""
+    kinds = {
+        'resource': sorted(schema.get('resource_schemas', {}).items()),
+        'data': sorted(schema.get('data_source_schemas', {}).items()),
+    }
+    body = '\n\n'.join(
+        [
+            *(
+                type_source(kind, type_, type_schema)
+                for kind, types in kinds.items()
+                for type_, type_schema in types
+            ),
+            *(
+                namespace_source(kind, source, (type_ for type_, _ in kinds[kind]))
+                for kind in kinds
+            ),
+        ]
+    )
+    typing_names = [name for name in ('Any', 'Required', 'Unpack') if findall(rf'\b{name}\b', body)]
+    names = [
+        name
+        for name in ('Bool', 'DataMeta', 'Number', 'ResourceMeta', 'String', 'TypedBlock')
+        if findall(rf'\b{name}\b', body)
+    ]
+    return (
+        f'"""Typed resource and data source blocks for {source}."""\n'
+        '\n'
+        '# AUTOGENERATED by helicopyter.bindings\n'
+        f'from typing import {", ".join(typing_names)}\n'
+        '\n'
+        f'from helicopyter.bindings import {", ".join(names)}\n'
+        '\n\n'
+        f'{body}'
+    )
+
+
+def generate(schema: Mapping[str, Any]) -> dict[str, str]:
+    """Return module source by module name for each provider in a providers schema dump."""
+    return {
+        module_name(source): provider_source(source, provider_schema)
+        for source, provider_schema in schema.get('provider_schemas', {}).items()
+    }
+
+
+def write_bindings(schema_path: Path, output_directory: Path) -> list[Path]:
+    """Write a module per provider in schema_path into the output_directory package."""
+    paths = []
+    for name, source in generate(loads(schema_path.read_text())).items():
+        path = output_directory / f'{name}.py'
+        if write_if_changed(path, [source]):
+            paths.append(path)
+    (output_directory / '__init__.py').touch()
+    return paths
@@ -0,0 +1,71 @@
+"""Skip codenames whose inputs and outputs are unchanged since the last run."""
+
+from collections.abc import Iterable, Mapping
+from hashlib import sha256
+from json import JSONDecodeError, dumps, loads
+from os import environ
+from pathlib import Path
+from typing import Any
+
+from helicopyter.dependencies import environment_names, local_dependencies
+
+MANIFEST = Path('.helicopyter-cache/manifest.json')
+
+
+def digest(path: Path) -> str:
+    return sha256(path.read_bytes()).hexdigest() if path.exists() else ''
+
+
+def fingerprint(top_directory: Path, cona: str, options: Mapping[str, object]) -> str:
+    """Hash main.py, its local imports, the environment variables they read, and options."""
+    files = local_dependencies(
+        top_directory, top_directory / 'deploys' / cona / 'terraform' / 'main.py'
+    )
+    return sha256(
+        dumps(
+            {
+                'environment': {name: environ.get(name) for name in environment_names(files)},
+                'files': {str(file.relative_to(top_directory)): digest(file) for file in files},
+                # An installed helicopyter is not under top_directory
+                'helicopyter': {
+                    file.name: digest(file) for file in Path(__file__).parent.glob('*.py')
+                },
+                'options': options,
+            },
+            default=str,
+            sort_keys=True,
+        ).encode()
+    ).hexdigest()
+
+
+def read_manifest(top_directory: Path) -> dict[str, dict[str, Any]]:
+    try:
+        return loads((top_directory / MANIFEST).read_text())
+    except (FileNotFoundError, JSONDecodeError):
+        return {}
+
+
+def write_manifest(top_directory: Path, manifest: Mapping[str, Mapping[str, Any]]) -> None:
+    path = top_directory / MANIFEST
+    path.parent.mkdir(exist_ok=True)
+    (temporary := path.with_suffix('.tmp')).write_text(dumps(manifest, indent=4, sort_keys=True))
+    temporary.replace(path)
+
+
+def record(top_directory: Path, fingerprint: str, relative_paths: Iterable[str]) -> dict[str, Any]:
+    return {
+        'digests': {path: digest(top_directory / path) for path in relative_paths},
+        'fingerprint': fingerprint,
+    }
+
+
+def is_fresh(top_directory: Path, entry: Mapping[str, Any] | None, fingerprint: str) -> bool:
+    """Whether entry matches fingerprint and none of its output files were edited or deleted."""
+    return bool(
+        entry
+        and entry['fingerprint'] == fingerprint
+        and entry.get('digests')
+        and all(
+            recorded == digest(top_directory / path) for path, recorded in entry['digests'].items()
+        )
+    )
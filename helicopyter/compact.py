@@ -0,0 +1,100 @@
+"""
+Rewrite groups of similar resource blocks into one block with for_each over a locals map.
+
+Each group shares a resource type and attribute names. Attributes equal across the group stay
+literal; the rest move into `local.<type>_<label>` and are read back with `each.value`. A
+moved block per original address lets Terraform keep the existing state.
+"""
+
+from collections.abc import Iterable
+from itertools import count
+from re import findall
+
+from helicopyter import Block, Reference, iter_hcl
+
+# Smaller groups grow, not shrink, once locals and moved blocks are added
+MINIMUM = 3
+# Meta-arguments Terraform needs to know before evaluating each.value
+STATIC = frozenset({'count', 'depends_on', 'for_each', 'lifecycle', 'provider'})
+
+
+def is_candidate(block: Block, referenced: set[str]) -> bool:
+    return (
+        block.kind == 'resource'
+        and len(block.labels) == 2
+        and 'count' not in block.attributes
+        and 'for_each' not in block.attributes
+        and not any(
+            isinstance(value, Block) and value.attributes for value in block.attributes.values()
+        )
+        and '.'.join(block.labels) not in referenced
+    )
+
+
+def referenced_addresses(blocks: Iterable[Block]) -> set[str]:
+    """Return `type.name` pairs appearing in any expression or template, like aws_iam_role.x."""
+    # Overlapping, so resource.null_resource.a also yields null_resource.a
+    pairs = findall(r'(?=\b([a-z][a-z0-9_]*)\.([A-Za-z_][\w-]*))', ''.join(iter_hcl(blocks)))
+    return {f'{type_}.{name}' for type_, name in pairs}
+
+
+def compact_group(group: list[Block], label: str) -> list[Block]:
+    """Return a locals block, one for_each block, and a moved block per member of group."""
+    type_ = group[0].labels[0]
+    first = group[0].attributes
+    varying = [
+        key
+        for key, value in first.items()
+        if any(block.attributes[key] != value for block in group[1:])
+    ]
+    if not varying or len(varying) == len(first) or STATIC.intersection(varying):
+        return group
+    local_name = f'{type_}_{label}'
+    values = Block('locals')
+    values.attributes = {
+        local_name: {
+            block.labels[1]: {key: block.attributes[key] for key in varying} for block in group
+        }
+    }
+    compacted = Block('resource', type_, label)
+    compacted.attributes = {
+        'for_each': Reference(f'local.{local_name}'),
+        **{
+            key: Reference(f'each.value.{key}') if key in varying else value
+            for key, value in first.items()
+        },
+    }
+    moves = []
+    for block in group:
+        move = Block('moved')
+        move.attributes = {
+            'from': Reference(f'{type_}.{block.labels[1]}'),
+            'to': Reference(f'{type_}.{label}["{block.labels[1]}"]'),
+        }
+        moves.append(move)
+    return [values, compacted, *moves]
+
+
+def compact(blocks: list[Block]) -> list[Block]:
+    """Return blocks with each group of at least MINIMUM similar resources compacted."""
+    referenced = referenced_addresses(blocks)
+    groups: dict[tuple[str, tuple[str, ...]], list[Block]] = {}
+    for block in blocks:
+        if is_candidate(block, referenced):
+            groups.setdefault((block.labels[0], tuple(block.attributes)), []).append(block)
+    names = {'.'.join(block.labels) for block in blocks if block.kind == 'resource'}
+    replacements: dict[int, list[Block]] = {}
+    for (type_, _), group in groups.items():
+        if len(group) < MINIMUM:
+            continue
+        label = next(
+            label
+            for label in (f'this{index or ""}' for index in count())
+            if f'{type_}.{label}' not in names
+        )
+        compacted = compact_group(group, label)
+        if compacted is not group:
+            names.add(f'{type_}.{label}')
+            replacements[id(group[0])] = compacted
+            replacements.update({id(block): [] for block in group[1:]})
+    return [replacement for block in blocks for replacement in replacements.get(id(block), [block])]
@@ -0,0 +1,84 @@
+"""Statically find the local files and environment variables a deploy depends on."""
+
+from ast import AST, Attribute, Call, Constant, Import, ImportFrom, Name, Subscript, parse, walk
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+
+def module_files(top_directory: Path, module: str) -> Iterator[Path]:
+    """
+    Yield the files executed by importing module, if its top-level package is local.
+
+    The module's own file is yielded even when missing, so that optional modules like
+    deploys.buddies.members count as soon as they appear.
+    """
+    parts = module.split('.')
+    if not ((top_directory / parts[0]).is_dir() or (top_directory / f'{parts[0]}.py').exists()):
+        return
+    for index in range(1, len(parts)):
+        package = top_directory.joinpath(*parts[:index], '__init__.py')
+        if package.exists():
+            yield package
+    package = top_directory.joinpath(*parts, '__init__.py')
+    yield package if package.exists() else top_directory.joinpath(*parts).with_suffix('.py')
+
+
+def imported_modules(top_directory: Path, path: Path) -> Iterator[tuple[str, bool]]:
+    """Yield (name, certain) for each import; `from a import b` names may be attributes."""
+    package = path.relative_to(top_directory).parent.parts
+    for node in walk(parse(path.read_bytes(), path)):
+        if isinstance(node, Import):
+            yield from ((alias.name, True) for alias in node.names)
+        elif isinstance(node, ImportFrom):
+            base = package[: len(package) - node.level + 1] if node.level else ()
+            module = '.'.join((*base, *filter(None, [node.module])))
+            yield module, True
+            yield from ((f'{module}.{alias.name}', False) for alias in node.names)
+
+
+def local_dependencies(top_directory: Path, path: Path) -> set[Path]:
+    """Return path, its packages, and every local file they import, whether present or not."""
+    module = '.'.join(path.relative_to(top_directory).with_suffix('').parts)
+    dependencies = {path, *module_files(top_directory, module)}
+    pending = list(dependencies)
+    while pending:
+        current = pending.pop()
+        if not current.exists():
+            continue
+        for imported, certain in imported_modules(top_directory, current):
+            files = list(module_files(top_directory, imported))
+            if certain or (files and files[-1].exists()):
+                pending.extend(set(files) - dependencies)
+                dependencies.update(files)
+    return dependencies
+
+
+def is_named(node: AST, name: str) -> bool:
+    return (isinstance(node, Name) and node.id == name) or (
+        isinstance(node, Attribute) and node.attr == name
+    )
+
+
+def environment_names(paths: Iterable[Path]) -> set[str]:
+    """Return literal names read by environ[...], environ.get(...), getenv(...), and similar."""
+    names = set()
+    for path in paths:
+        if not path.exists():
+            continue
+        for node in walk(parse(path.read_bytes(), path)):
+            if isinstance(node, Subscript) and is_named(node.value, 'environ'):
+                key = node.slice
+            elif (
+                isinstance(node, Call)
+                and node.args
+                and (
+                    is_named(node.func, 'getenv')
+                    or (isinstance(node.func, Attribute) and is_named(node.func.value, 'environ'))
+                )
+            ):
+                key = node.args[0]
+            else:
+                continue
+            if isinstance(key, Constant) and isinstance(key.value, str):
+                names.add(key.value)
+    return names
@@ -0,0 +1,182 @@
+"""
+Compare two synthesized main.tf or main.tf.json files by block address instead of by line.
+
+Each file becomes an index from address, like resource.github_repository.helicopyter, locals, or
+provider.github, to that block's attributes and nested blocks. HCL is read a line at a time as
+helicopyter and `terraform fmt` write it, so alignment changes do not count as differences.
+Both files should be in the same format, since HCL and JSON spell the same value differently.
+"""
+
+from collections.abc import Iterable, Iterator, Mapping
+from json import dumps, loads
+from pathlib import Path
+from re import findall, match, search
+from typing import Any
+
+from helicopyter.formatting import bracket_change, scan, split_assignment
+
+# Address to attribute or nested block name to its normalized text
+Index = dict[str, dict[str, str]]
+
+# JSON nesting depth of labels for each kind, otherwise one, like provider.github
+LABELS = {
+    'data': 2,
+    'import': 0,
+    'locals': 0,
+    'moved': 0,
+    'removed': 0,
+    'resource': 2,
+    'terraform': 0,
+}
+# Characters starting strings and comments, which scan must step through
+QUOTED = frozenset('"#/')
+# Attributes telling apart blocks of a kind with the same labels, like aliased providers
+KEYS = {'import': 'to', 'moved': 'from', 'provider': 'alias', 'removed': 'from'}
+
+
+def header_address(header: str) -> str:
+    """Return `kind.label.label` for a block header, like resource "aws_vpc" "this" {."""
+    return '.'.join(
+        quoted or bare for quoted, bare in findall(r'"((?:[^"\\]|\\.)*)"|([^\s"{}]+)', header)
+    )
+
+
+def add(index: Index, address: str, attributes: dict[str, str]) -> None:
+    """Add attributes under address, merging repeated blocks like locals."""
+    kind = address.partition('.')[0]
+    if kind in KEYS and KEYS[kind] in attributes:
+        key = attributes[KEYS[kind]].partition('=')[2].strip().strip('"')
+        address = f'{address}.{key}'
+    index.setdefault(address, {}).update(attributes)
+
+
+def normalized(text: str, code: list[tuple[int, str]], depth: int) -> str:
+    """Return text indented by depth within its block, without alignment padding before `=`."""
+    lead, assignment = split_assignment(text, code)
+    indent = '  ' * (depth - 1 - text.startswith(('}', ']', ')')))
+    return indent + (lead if assignment is None else f'{lead} {assignment}')
+
+
+def hcl_index(lines: Iterable[str]) -> Index:
+    """Return the index of HCL lines, in one pass."""
+    index: Index = {}
+    address = ''
+    attributes: dict[str, str] = {}
+    # The attribute or nested block being read, and its lines so far
+    name = ''
+    value: list[str] = []
+    depth = 0
+    delimiter = ''
+    for line in lines:
+        text = line.strip()
+        if delimiter:
+            # Heredoc contents and the closing delimiter are kept verbatim
+            value.append(line.rstrip('\n'))
+            delimiter = '' if text == delimiter else delimiter
+        elif not text or (depth == 0 and text.startswith(('#', '//'))):
+            continue
+        else:
+            # Most lines have no strings or comments, so every character is code
+            code = list(enumerate(text)) if QUOTED.isdisjoint(text) else scan(text)[0]
+            if heredoc := search(r'<<-?([A-Za-z_][\w-]*)$', text):
+                delimiter = heredoc[1]
+                code = [
+                    (position, character)
+                    for position, character in code
+                    if position < heredoc.start()
+                ]
+            net = bracket_change(code)
+            if depth == 0:
+                address, attributes = header_address(text), {}
+            elif depth == 1 and not name and net < 0:
+                add(index, address, attributes)
+            else:
+                if depth == 1 and not name:
+                    attribute = match(r'([\w-]+)\s*=(?!=)', text)
+                    name = attribute[1] if attribute else header_address(text)
+                value.append(normalized(text, code, depth))
+            depth += net
+            if depth == 0 and net == 0:
+                # An empty block on one line, like locals {}
+                add(index, address, attributes)
+        if name and depth == 1 and not delimiter:
+            attributes[name] = '\n'.join([*filter(None, [attributes.get(name)]), *value])
+            name, value = '', []
+    return index
+
+
+def labelled(address: str, body: Any, labels: int) -> Iterator[tuple[str, Mapping[str, Any]]]:
+    """Yield (address, body) for each block nested labels deep, or in a list, under address."""
+    if isinstance(body, list):
+        for item in body:
+            yield from labelled(address, item, labels)
+    elif labels:
+        for label, item in body.items():
+            yield from labelled(f'{address}.{label}', item, labels - 1)
+    else:
+        yield address, body
+
+
+def json_index(tree: Mapping[str, Any]) -> Index:
+    """Return the index of a Terraform JSON configuration, like a loaded main.tf.json."""
+    index: Index = {}
+    for kind, body in tree.items():
+        if kind == '//':
+            continue
+        for address, attributes in labelled(kind, body, LABELS.get(kind, 1)):
+            add(
+                index,
+                address,
+                {
+                    name: f'{name} = {dumps(value, sort_keys=True)}'
+                    for name, value in attributes.items()
+                    if name != '//'
+                },
+            )
+    return index
+
+
+def read_index(path: Path) -> Index:
+    """Return the index of a main.tf or main.tf.json file, telling them apart by content."""
+    text = path.read_text()
+    return (
+        json_index(loads(text)) if text.lstrip().startswith('{') else hcl_index(text.splitlines())
+    )
+
+
+def prefixed(sign: str, text: str) -> Iterator[str]:
+    for line in text.splitlines():
+        yield f'    {sign} {line}'
+
+
+def diff(old: Index, new: Index) -> list[str]:
+    """Return lines describing removed, changed, then added blocks, and changes to attributes."""
+    lines = []
+    for address, attributes in old.items():
+        if address not in new:
+            lines.append(f'- {address}')
+        elif attributes != new[address]:
+            lines.append(f'~ {address}')
+            for name, text in attributes.items():
+                if text != new[address].get(name):
+                    lines.extend(prefixed('-', text))
+                    if name in new[address]:
+                        lines.extend(prefixed('+', new[address][name]))
+            lines.extend(
+                line
+                for name, text in new[address].items()
+                if name not in attributes
+                for line in prefixed('+', text)
+            )
+    lines.extend(f'+ {address}' for address in new if address not in old)
+    return lines
+
+
+def compare(old_path: Path, new_path: Path) -> bool:
+    """Print the differences between two synthesized files and a summary; return if any."""
+    lines = diff(read_index(old_path), read_index(new_path))
+    counts = {sign: sum(line.startswith(sign) for line in lines) for sign in '-~+'}
+    for line in lines:
+        print(line)  # noqa: T201
+    print(f'{counts["+"]} added, {counts["-"]} removed, {counts["~"]} changed blocks')  # noqa: T201
+    return bool(lines)
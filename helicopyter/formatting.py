@@ -0,0 +1,174 @@
+"""
+Format HCL like `terraform fmt` without starting a subprocess.
+
+Mirrors hclwrite's indentation, `=` alignment, and trailing comment alignment, and unwraps
+attributes that are one interpolation, like `"${var.a}"`, as `terraform fmt` does. Spacing between
+tokens is left alone because helicopyter and cdktf already emit it canonically.
+"""
+
+from collections.abc import Iterable, Iterator
+from re import search
+
+# Indent, lead, assignment, trailing comment, heredoc lines
+Row = tuple[int, str, str | None, str | None, list[str]]
+
+
+def step_in_template(text: str, index: int, contexts: list[str]) -> int:
+    """Return how far to advance within a quoted template, pushing or popping contexts."""
+    if text[index] == '\\':
+        return 2
+    if text.startswith(('$${', '%%{'), index):
+        return 3
+    if text.startswith(('${', '%{'), index):
+        contexts.append('${')
+        return 2
+    if text[index] == '"':
+        contexts.pop()
+    return 1
+
+
+def scan(text: str) -> tuple[list[tuple[int, str]], int]:
+    """Return (index, character) pairs outside strings and comments, and where a comment starts."""
+    code = []
+    # '"' for a quoted template, '${' for an interpolation inside one, '{' for braces within that
+    contexts: list[str] = []
+    index = 0
+    while index < len(text):
+        if contexts and contexts[-1] == '"':
+            index += step_in_template(text, index, contexts)
+            continue
+        if text[index] == '"':
+            contexts.append('"')
+        elif not contexts and (text[index] == '#' or text.startswith(('//', '/*'), index)):
+            return code, index
+        elif contexts and text[index] in '{}':
+            contexts.append('{') if text[index] == '{' else contexts.pop()
+        elif not contexts:
+            code.append((index, text[index]))
+        index += 1
+    return code, len(text)
+
+
+def bracket_change(code: Iterable[tuple[int, str]]) -> int:
+    return sum((character in '{[(') - (character in '}])') for _, character in code)
+
+
+def runs(flags: Iterable[bool]) -> Iterator[tuple[int, int]]:
+    """Yield (start, stop) of each run of consecutive True flags."""
+    start = None
+    for index, flag in enumerate([*flags, False]):
+        if flag and start is None:
+            start = index
+        elif not flag and start is not None:
+            yield start, index
+            start = None
+
+
+def align(rows: list[Row]) -> Iterator[str]:
+    """Yield lines with `=` aligned within runs of assignments, then comments within theirs."""
+    codes = ['  ' * indent + lead if lead else '' for indent, lead, *_ in rows]
+    for cell in (2, 3):
+        for start, stop in runs(row[cell] is not None for row in rows):
+            width = max(len(code) for code in codes[start:stop])
+            for index in range(start, stop):
+                codes[index] = f'{codes[index].ljust(width)} {rows[index][cell]}'
+    for code, (*_, heredoc) in zip(codes, rows, strict=True):
+        yield code + '\n'
+        yield from heredoc
+
+
+def track_indent(indents: list[int], net: int) -> int:
+    """Return the indent level of a line, updating the stack of bracket counts per level."""
+    closed = max(-net, 0)
+    while closed and indents:
+        if closed < indents[-1]:
+            indents[-1] -= closed
+            closed = 0
+        else:
+            closed -= indents.pop()
+    indent = len(indents)
+    if net > 0:
+        indents.append(net)
+    return indent
+
+
+def split_assignment(lead: str, code: list[tuple[int, str]]) -> tuple[str, str | None]:
+    """Split at the first `=` if the expression after it is complete on this line."""
+    for index, character in code:
+        if (
+            character == '='
+            and index
+            and lead[index - 1] not in '=!<>'
+            and lead[index + 1 : index + 2] not in {'=', '>'}
+        ):
+            if bracket_change(pair for pair in code if pair[0] >= index):
+                break
+            return lead[:index].rstrip(), '= ' + lead[index + 1 :].lstrip()
+    return lead, None
+
+
+def interpolation(value: str) -> str | None:
+    """Return the expression of a template that is only one interpolation, like "${var.a}"."""
+    if not (value.startswith('"${') and value.endswith('}"')):
+        return None
+    contexts = ['"', '${']
+    index = 3
+    while index < len(value) - 2:
+        if contexts[-1] == '"':
+            index += step_in_template(value, index, contexts)
+        else:
+            if value[index] in '"{':
+                contexts.append(value[index])
+            elif value[index] == '}':
+                contexts.pop()
+            index += 1
+        # The interpolation ended before the closing quote, so text or another sequence follows
+        if len(contexts) < 2:
+            return None
+    return value[3:-2].strip() if contexts == ['"', '${'] else None
+
+
+def format_lines(lines: Iterable[str]) -> Iterator[str]:
+    """Yield formatted lines, buffering only while an alignment run is open."""
+    delimiter = ''
+    indents: list[int] = []
+    # Whether each indent level is a block body, whose attributes `terraform fmt` unwraps
+    bodies = [True]
+    rows: list[Row] = []
+    for line in lines:
+        if delimiter:
+            # Heredoc contents and the closing delimiter pass through untouched
+            rows[-1][4].append(line if line.endswith('\n') else line + '\n')
+            delimiter = '' if line.strip() == delimiter else delimiter
+            continue
+        text = line.strip()
+        code, comment_index = scan(text)
+        lead, comment = (
+            (text[:comment_index].rstrip(), text[comment_index:] or None)
+            if comment_index
+            else (text, None)
+        )
+        if heredoc := search(r'<<-?([A-Za-z_][\w-]*)$', lead):
+            delimiter = heredoc[1]
+            code = [(index, character) for index, character in code if index < heredoc.start()]
+
+        net = bracket_change(code)
+        indent = track_indent(indents, net)
+        lead, assign = split_assignment(lead, code)
+        del bodies[indent + 1 :]
+        if net > 0:
+            # A block header, unlike `name = {`, has no `=` outside its quoted labels
+            bodies.append(
+                bodies[indent] and lead.endswith('{') and all(pair[1] != '=' for pair in code)
+            )
+        if assign and bodies[indent] and (expression := interpolation(assign[2:])):
+            assign = f'= {expression}'
+        rows.append((indent, lead, assign, comment, []))
+        if assign is None and comment is None and not delimiter:
+            yield from align(rows)
+            rows = []
+    yield from align(rows)
+
+
+def format_hcl(text: str) -> str:
+    return ''.join(format_lines(text.splitlines(keepends=True)))
@@ -0,0 +1,64 @@
+"""
+Encode strings and object keys as Hashicorp Configuration Language (HCL).
+
+Strings remain templates, so `${...}` and `%{...}` interpolate, matching Terraform JSON output.
+"""
+
+from collections.abc import Iterator
+from itertools import count
+from re import compile as compile_regex
+from typing import Any
+
+# Quoted templates support \\ \" \n \r \t; other control characters need \\uNNNN
+CONTROL = compile_regex(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
+IDENTIFIER = compile_regex(r'[A-Za-z_][\w-]*')
+# Heredocs keep text verbatim, which a carriage return or other control characters would not
+VERBATIM = compile_regex(r'[^\x00-\x08\x0b-\x1f\x7f]*\n')
+
+
+def escape(text: str) -> str:
+    # Several C-speed replace passes are faster than one str.translate with multi-character values
+    text = (
+        text.replace('\\', '\\\\')
+        .replace('"', '\\"')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+        .replace('\t', '\\t')
+    )
+    return CONTROL.sub(lambda match: f'\\u{ord(match[0]):04x}', text)
+
+
+def string_fragments(text: str, *, heredoc: bool = True) -> Iterator[str]:
+    """
+    Yield text as a heredoc if it is multiline and ends with a newline, else quoted and escaped.
+
+    A heredoc's closing delimiter must end its line, so pass heredoc=False where a comma follows.
+    Large strings are yielded whole rather than copied into a formatted string.
+    """
+    if heredoc and VERBATIM.fullmatch(text) and text.find('\n') < len(text) - 1:
+        lines = {line.strip() for line in text.splitlines()}
+        delimiter = next(
+            delimiter
+            for delimiter in (f'EOT{index or ""}' for index in count())
+            if delimiter not in lines
+        )
+        yield f'<<{delimiter}\n'
+        yield text
+        yield delimiter
+    else:
+        yield '"'
+        yield escape(text)
+        yield '"'
+
+
+def quoted(text: str) -> str:
+    return ''.join(string_fragments(text, heredoc=False))
+
+
+def object_key(key: Any) -> str:
+    """Return key bare if an identifier, quoted if another string or number, else an expression."""
+    if isinstance(key, int | float):
+        key = str(key)
+    if not isinstance(key, str):
+        return f'({key})'
+    return key if IDENTIFIER.fullmatch(key) else quoted(key)
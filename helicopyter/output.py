@@ -0,0 +1,88 @@
+"""
+Write generated files atomically, leaving unchanged files and their mtimes alone.
+
+JSON is encoded in chunks as it is written, rather than as one string beside the dictionary.
+In check mode, output is compared with the file instead, by hash, and nothing is written.
+"""
+
+from collections.abc import Iterable, Iterator
+from difflib import unified_diff
+from filecmp import cmp
+from hashlib import file_digest, sha256
+from json import JSONEncoder
+from os import getpid
+from pathlib import Path
+from typing import Any
+
+# Objects this deep, like resource.aws_instance.web in main.tf.json, are minified in one C call
+MINIFY_DEPTH = 3
+MINIFIER = JSONEncoder(separators=(',', ':'), sort_keys=True)
+
+
+def write_if_changed(path: Path, chunks: Iterable[str]) -> bool:
+    """Write chunks to a temporary sibling and rename it over path; return False if unchanged."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f'.{path.name}.{getpid()}.tmp')
+    try:
+        with temporary.open('x') as file:
+            file.writelines(chunks)
+        if path.exists() and cmp(temporary, path, shallow=False):
+            temporary.unlink()
+            return False
+        temporary.replace(path)
+    except BaseException:
+        temporary.unlink(missing_ok=True)
+        raise
+    return True
+
+
+def diff_if_changed(path: Path, chunks: Iterable[str], name: str) -> list[str]:
+    """Return a unified diff from path to chunks, labelled with name, or [] if they match."""
+    generated = []
+    hasher = sha256()
+    for chunk in chunks:
+        generated.append(chunk)
+        hasher.update(chunk.encode())
+    if path.exists():
+        with path.open('rb') as file:
+            if file_digest(file, sha256).digest() == hasher.digest():
+                return []
+        current = path.read_text().splitlines(keepends=True)
+    else:
+        current = []
+    return list(
+        unified_diff(
+            current, ''.join(generated).splitlines(keepends=True), f'a/{name}', f'b/{name}'
+        )
+    )
+
+
+def minified_chunks(value: Any, depth: int = 0) -> Iterator[str]:
+    # json sorts other keys before converting them to strings, which this loop would not match
+    if (
+        depth >= MINIFY_DEPTH
+        or not isinstance(value, dict)
+        or not value
+        or not all(isinstance(key, str) for key in value)
+    ):
+        yield MINIFIER.encode(value)
+        return
+    separator = '{'
+    for key in sorted(value):
+        yield f'{separator}{MINIFIER.encode(key)}:'
+        yield from minified_chunks(value[key], depth + 1)
+        separator = ','
+    yield '}'
+
+
+def json_chunks(value: Any, *, minify: bool = False) -> Iterator[str]:
+    """
+    Yield value as key-sorted JSON, joining to exactly what dumps(value, sort_keys=True) returns.
+
+    Indented by 4 spaces, or, given minify, without any whitespace.
+    """
+    if minify:
+        yield from minified_chunks(value)
+    else:
+        # Like dumps, which also encodes indented JSON in Python rather than C, but never joined
+        yield from JSONEncoder(indent=4, sort_keys=True).iterencode(value)
@@ -0,0 +1,59 @@
+"""Parse command line arguments for `python -m helicopyter`."""
+
+from pathlib import Path
+
+from tap import Tap
+
+
+class Parameters(Tap):
+    conas: list[str]  # pyright:ignore[reportUninitializedInstanceVariable]
+    batch_format: bool = False  # Stage all HCL and run one `fmt -recursive` instead of one each
+    cache: bool = False  # Skip codenames whose inputs are unchanged since the last --cache run
+    check: bool = False  # Write nothing; print diffs and exit 1 if any file is out of date
+    compact: bool = False  # Merge 3+ similar resource blocks into for_each, with moved blocks
+    directory: Path | None = None
+    format_with: str = 'terraform'  # terraform, tofu, or builtin to skip the subprocess
+    hashicorp_configuration_language: bool = True
+    jobs: int = 1
+    minify_json: bool = False  # Write main.tf.json without whitespace, for machines only
+    profile: Path | None = None  # Write each codename's phase times and peak memory as JSON here
+    watch: bool = False  # Synthesize again, in this process, as deploys and their imports change
+
+    def configure(self) -> None:  # noqa: D102
+        self.add_argument('conas', help='space-separated COdeNAmes')
+        self.add_argument('-C', '--directory')  # Like make and tar
+        self.add_argument('-j', '--jobs', help='worker processes, each reused')  # Like make
+
+
+class ServeParameters(Tap):
+    directory: Path | None = None
+
+    def configure(self) -> None:  # noqa: D102
+        self.add_argument('-C', '--directory')
+
+
+class AffectedParameters(Tap):
+    ref: str  # pyright:ignore[reportUninitializedInstanceVariable]
+    directory: Path | None = None
+
+    def configure(self) -> None:  # noqa: D102
+        self.add_argument('ref', help='git ref to compare with, like origin/main')
+        self.add_argument('-C', '--directory')
+
+
+class BindingsParameters(Tap):
+    schema: Path  # pyright:ignore[reportUninitializedInstanceVariable]
+    output: Path = Path('bindings')  # Package to write a module per provider into
+
+    def configure(self) -> None:  # noqa: D102
+        self.add_argument('schema', help='output of `terraform providers schema -json`')
+        self.add_argument('-o', '--output')
+
+
+class DiffParameters(Tap):
+    old: Path  # pyright:ignore[reportUninitializedInstanceVariable]
+    new: Path  # pyright:ignore[reportUninitializedInstanceVariable]
+
+    def configure(self) -> None:  # noqa: D102
+        self.add_argument('old', help='main.tf or main.tf.json from the previous synthesis')
+        self.add_argument('new', help='the same file from the new synthesis, in the same format')
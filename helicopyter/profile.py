@@ -0,0 +1,119 @@
+"""
+Measure wall time, CPU time, and peak memory of each codename's synthesis phases.
+
+Includes child processes like the JSII Node.js runtime. Child figures come from Linux's /proc and
+are omitted elsewhere, where peak memory is the whole run's rather than each phase's.
+"""
+
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager, suppress
+from importlib import import_module
+from json import dumps
+from os import sysconf
+from pathlib import Path
+from sys import platform
+from time import perf_counter, process_time
+from typing import Any
+
+# ruff: noqa: T201
+phases: list[dict[str, Any]] = []
+
+
+def status_kilobytes(pid: int | str, field: str) -> int | None:
+    try:
+        with Path(f'/proc/{pid}/status').open() as lines:
+            return next(int(line.split()[1]) for line in lines if line.startswith(f'{field}:'))
+    except (OSError, StopIteration):
+        return None
+
+
+def reset_peak() -> None:
+    """Restart this process's high water mark, so VmHWM shows the peak of one phase."""
+    with suppress(OSError):
+        Path('/proc/self/clear_refs').write_text('5')
+
+
+def peak_bytes() -> int:
+    kilobytes = status_kilobytes('self', 'VmHWM')
+    if kilobytes is not None:
+        return 1024 * kilobytes
+    # Without /proc, ru_maxrss is the peak of the whole run, in bytes on macOS and kilobytes on BSD
+    resource = import_module('resource')
+    maximum = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maximum if platform == 'darwin' else 1024 * maximum
+
+
+def children() -> dict[int, tuple[float, int]]:
+    """Return CPU seconds and peak resident bytes of each running child, like JSII's node."""
+    usage = {}
+    for path in Path('/proc/self/task').glob('*/children'):
+        for pid in Path(path).read_text().split():
+            try:
+                fields = Path(f'/proc/{pid}/stat').read_text().rpartition(')')[2].split()
+            except OSError:
+                continue
+            # utime and stime, fields 14 and 15 counting from pid, are in clock ticks
+            seconds = (int(fields[11]) + int(fields[12])) / sysconf('SC_CLK_TCK')
+            usage[int(pid)] = (seconds, 1024 * (status_kilobytes(pid, 'VmHWM') or 0))
+    return usage
+
+
+@contextmanager
+def measure(cona: str, phase: str) -> Iterator[dict[str, Any]]:
+    """Record a phase; the caller may add counts, like blocks, to the yielded entry."""
+    entry: dict[str, Any] = {'cona': cona, 'phase': phase}
+    reset_peak()
+    before = children()
+    started = perf_counter(), process_time()
+    yield entry
+    wall, cpu = perf_counter() - started[0], process_time() - started[1]
+    after = children()
+    entry |= {
+        'children_cpu_seconds': sum(
+            seconds - before.get(pid, (0, 0))[0] for pid, (seconds, _) in after.items()
+        ),
+        'children_peak_bytes': sum(peak for _, peak in after.values()),
+        'cpu_seconds': cpu,
+        'peak_bytes': peak_bytes(),
+        'wall_seconds': wall,
+    }
+    phases.append(entry)
+
+
+def with_phases(
+    function: Callable[..., Any], *args: Any, **kwargs: Any
+) -> tuple[Any, list[dict[str, Any]]]:
+    """Return function's result and the phases it measured, to send back from a worker process."""
+    phases.clear()
+    return function(*args, **kwargs), phases.copy()
+
+
+def report(path: Path, limit: int = 10) -> None:
+    """Write every phase as JSON to path and print totals, the slowest phases, and imports."""
+    path.write_text(dumps({'phases': phases}, indent=4, sort_keys=True) + '\n')
+    totals: dict[str, float] = {}
+    for entry in phases:
+        totals[entry['phase']] = totals.get(entry['phase'], 0) + entry['wall_seconds']
+    print(f'{"phase":<10} {"wall":>9}')
+    for phase, seconds in sorted(totals.items(), key=lambda item: -item[1]):
+        print(f'{phase:<10} {seconds:8.3f}s')
+    print(f'\n{"codename":<24} {"phase":<10} {"wall":>9} {"cpu":>9} {"child cpu":>9} {"peak":>9}')
+    for entry in sorted(phases, key=lambda entry: -entry['wall_seconds'])[:limit]:
+        print(
+            f'{entry["cona"]:<24} {entry["phase"]:<10} {entry["wall_seconds"]:8.3f}s'
+            f' {entry["cpu_seconds"]:8.3f}s {entry["children_cpu_seconds"]:8.3f}s'
+            f' {entry["peak_bytes"] / 2**20:6.0f}MiB'
+        )
+    imports = sorted(
+        (
+            (seconds, module, entry['cona'])
+            for entry in phases
+            for module, seconds in entry.get('imports', {}).items()
+        ),
+        reverse=True,
+    )
+    if imports:
+        print(f'\n{"provider module":<48} {"codename":<24} {"import":>9}')
+        for seconds, module, cona in imports[:limit]:
+            print(f'{module:<48} {cona:<24} {seconds:8.3f}s')
+    print(f'Wrote {path}')
@@ -0,0 +1,126 @@
+"""
+Keep cdktf, JSII, and provider packages loaded between runs, synthesizing over a Unix socket.
+
+A request is one JSON line of multisynth keyword arguments and the client's environment, which
+deploys and the cache fingerprint read in place of the daemon's. The response is the printed
+output, then a NUL and a JSON status.
+"""
+
+from collections.abc import Iterator, Mapping
+from contextlib import contextmanager, redirect_stdout, suppress
+from importlib import import_module
+from json import dumps, loads
+from os import chdir, environ
+from pathlib import Path
+from pkgutil import iter_modules
+from socket import AF_UNIX, SOCK_STREAM, socket
+from sys import modules, path
+from traceback import print_exc
+from typing import Any
+
+from helicopyter import multisynth
+from helicopyter.cache import MANIFEST
+
+# ruff: noqa: T201
+SOCKET = MANIFEST.with_name('serve.sock')
+PATHS = ('change_directory', 'profile')
+
+
+def warm() -> None:
+    """Import cdktf and each installed provider package, loading their JSII assemblies."""
+    import_module('helicopyter.stack')
+    for module in iter_modules():
+        if module.name.startswith('cdktf_cdktf_provider_'):
+            import_module(module.name)
+
+
+def forget_local_modules(top_directory: Path) -> None:
+    """Drop deploys, stacks, and other modules of top_directory so the next import reruns them."""
+    for name in [name for name in modules if name.partition('.')[0] != 'helicopyter']:
+        top_level = top_directory / name.partition('.')[0]
+        if top_level.is_dir() or top_level.with_suffix('.py').exists():
+            del modules[name]
+
+
+@contextmanager
+def environment(variables: Mapping[str, str]) -> Iterator[None]:
+    """Replace os.environ with variables, then restore the daemon's own."""
+    original = environ.copy()
+    environ.clear()
+    environ.update(variables)
+    try:
+        yield
+    finally:
+        environ.clear()
+        environ.update(original)
+
+
+def handle(connection: socket, top_directory: Path) -> None:
+    with connection, connection.makefile('rw') as stream:
+        message = loads(stream.readline())
+        arguments = message['arguments']
+        forget_local_modules(top_directory)
+        returncode = 0
+        with redirect_stdout(stream), environment(message['environment']):
+            try:
+                changed = multisynth(
+                    **{
+                        key: Path(value) if key in PATHS and value else value
+                        for key, value in arguments.items()
+                    }
+                )
+                returncode = int(bool(changed and arguments.get('check')))
+            except Exception:  # noqa: BLE001
+                print_exc(file=stream)
+                returncode = 1
+        stream.write('\0' + dumps({'returncode': returncode}))
+
+
+def serve(top_directory: Path) -> None:
+    """Answer requests, one at a time, until interrupted."""
+    top_directory = top_directory.resolve()
+    chdir(top_directory)
+    path.insert(0, str(top_directory))
+    warm()
+    address = top_directory / SOCKET
+    address.parent.mkdir(exist_ok=True)
+    address.unlink(missing_ok=True)
+    with socket(AF_UNIX, SOCK_STREAM) as server, suppress(KeyboardInterrupt):
+        server.bind(str(address))
+        server.listen()
+        print(f'Serving {top_directory} on {address}', flush=True)
+        try:
+            while True:
+                handle(server.accept()[0], top_directory)
+        finally:
+            address.unlink(missing_ok=True)
+
+
+def request(top_directory: Path, arguments: Mapping[str, Any]) -> int | None:
+    """Return the daemon's exit status after relaying its output, or None if none is running."""
+    client = socket(AF_UNIX, SOCK_STREAM)
+    try:
+        client.connect(str(top_directory / SOCKET))
+    except OSError:
+        client.close()
+        return None
+    with client, client.makefile('rw') as stream:
+        stream.write(
+            dumps(
+                {
+                    'arguments': {
+                        key: str(Path(value).resolve()) if key in PATHS and value else value
+                        for key, value in arguments.items()
+                    },
+                    'environment': dict(environ),
+                }
+            )
+            + '\n'
+        )
+        stream.flush()
+        for line in stream:
+            output, separator, status = line.partition('\0')
+            print(output, end='', flush=True)
+            if separator:
+                return loads(status + stream.read())['returncode']
+    return 1
@@ -0,0 +1,280 @@
+"""
+Split a Block deploy into shards, each a Terraform root module with its own state file.
+
+A deploy opts in by defining `shard(block) -> str | None` in main.py, like `shard = by_type`.
+Resources and modules given a shard name move to deploys/{cona}/terraform/{shard}/main.tf, the
+rest stay in main.tf. Every shard gets a copy of the terraform and provider blocks, with the S3
+backend key {cona}-{shard}.tfstate, and of each local, variable, and data source its resources
+read, directly or through each other; main.tf keeps those no other shard reads. Moved, import, and
+removed blocks go unchanged to the shard whose state holds the resource they name. A reference to
+a resource in another shard reads an output of that shard through terraform_remote_state, so
+shards reading each other in a cycle raise ValueError.
+"""
+
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from re import Match
+from re import compile as compile_regex
+from typing import Any
+
+from helicopyter import Block, Reference
+
+MAIN = ''
+SHARDED_KINDS = frozenset({'module', 'resource'})
+# Copied into every shard, since resources use them without naming them
+SHARED_KINDS = frozenset({'provider', 'terraform'})
+# Copied into the shards reading them, by the prefix expressions read them with
+VALUE_KINDS = {'data': 'data', 'locals': 'local', 'variable': 'var'}
+# Placed with the resource named by this attribute, since they act on that shard's state
+TARGET_KINDS = {'import': 'to', 'moved': 'to', 'removed': 'from'}
+# type.name or module.name, then an optional attribute, with no part of a longer traversal before
+ADDRESS = compile_regex(
+    r'(?<![\w.-])(?:resource\.)?([a-z][\w-]*)\.([A-Za-z_][\w-]*)(?:\.([A-Za-z_][\w-]*))?'
+)
+TEMPLATE = compile_regex(r'\$\{[^}]*\}')
+
+Shard = Callable[[Block], str | None]
+
+
+def by_type(block: Block) -> str | None:
+    """Shard resources by type, like aws_route53_record; keep modules in main.tf."""
+    return block.labels[0] if block.kind == 'resource' else None
+
+
+def address(block: Block) -> str:
+    return '.'.join(block.labels) if block.kind == 'resource' else f'module.{block.labels[0]}'
+
+
+def traversal(block: Block) -> str:
+    """Return the expression an attribute-less Block stands for, like random_id.b.hex."""
+    return '.'.join(block.labels if block.kind == 'resource' else (block.kind, *block.labels))
+
+
+def expressions(value: Any) -> Iterator[str]:
+    """Yield the references and templates within value, which may read other blocks."""
+    if isinstance(value, Block):
+        if value.attributes:
+            for item in value.attributes.values():
+                yield from expressions(item)
+        else:
+            yield traversal(value)
+    elif isinstance(value, Reference):
+        yield str(value)
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from expressions(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from expressions(item)
+    elif isinstance(value, str) and '${' in value:
+        yield value
+
+
+def reads(value: Any) -> set[str]:
+    """Return what value reads, like null_resource.a, module.m, data.d.e, local.x, or var.y."""
+    found = set()
+    for expression in expressions(value):
+        for kind, name, attribute in ADDRESS.findall(expression):
+            found.add(f'data.{name}.{attribute}' if kind == 'data' else f'{kind}.{name}')
+    return found
+
+
+def values_of(blocks: Iterable[Block]) -> dict[str, tuple[Block, Any]]:
+    """Return each local, variable, and data source, by how expressions read it, with its value."""
+    values = {}
+    for block in blocks:
+        if block.kind == 'locals':
+            values |= {f'local.{name}': (block, item) for name, item in block.attributes.items()}
+        elif block.kind in VALUE_KINDS:
+            values['.'.join((VALUE_KINDS[block.kind], *block.labels))] = (block, block)
+    return values
+
+
+def target(block: Block, owners: Mapping[str, str]) -> str:
+    """Return the shard owning the resource or module a moved, import, or removed block names."""
+    match = ADDRESS.match(str(block.attributes.get(TARGET_KINDS[block.kind], '')))
+    return owners.get(f'{match[1]}.{match[2]}', MAIN) if match else MAIN
+
+
+def closure(roots: Iterable[str], dependencies: Mapping[str, set[str]]) -> set[str]:
+    """Return the values among roots and those they read, transitively."""
+    needed: set[str] = set()
+    pending = list(roots)
+    while pending:
+        name = pending.pop()
+        if name in dependencies and name not in needed:
+            needed.add(name)
+            pending.extend(dependencies[name])
+    return needed
+
+
+def check_acyclic(edges: Mapping[str, Iterable[str]]) -> None:
+    """Raise ValueError if shards read each other's outputs in a cycle, none able to apply first."""
+    done: set[str] = set()
+    path: list[str] = []
+
+    def visit(name: str) -> None:
+        if name in path:
+            cycle = ' -> '.join(shard or 'main' for shard in [*path[path.index(name) :], name])
+            raise ValueError(f'Shards read each other in a cycle: {cycle}')
+        if name not in done:
+            path.append(name)
+            for other in sorted(edges[name]):
+                visit(other)
+            path.pop()
+            done.add(name)
+
+    for name in edges:
+        visit(name)
+
+
+class Rewriter:
+    """Copy blocks for one shard, redirecting references to other shards' resources."""
+
+    def __init__(self, shard: str, owners: dict[str, str]) -> None:
+        self.shard = shard
+        self.owners = owners
+        # Shard and output name to the expression it outputs
+        self.outputs: dict[str, dict[str, str]] = {}
+
+    def replace(self, match: Match[str]) -> str:
+        """Return match, or its output through terraform_remote_state if another shard owns it."""
+        owner = self.owners.get(f'{match[1]}.{match[2]}')
+        if owner is None or owner == self.shard:
+            return match[0]
+        expression = '.'.join(filter(None, match.groups()))
+        name = expression.replace('.', '_').replace('-', '_')
+        self.outputs.setdefault(owner, {})[name] = expression
+        return f'data.terraform_remote_state.{owner or "main"}.outputs.{name}'
+
+    def reference(self, block: Block) -> Any:
+        """Rewrite an attribute-less Block, which is a reference like resource.aws_vpc.this.id."""
+        if block.kind not in SHARDED_KINDS:
+            return block
+        labels = block.labels if block.kind == 'resource' else ('module', *block.labels)
+        traversal = '.'.join(labels)
+        rewritten = ADDRESS.sub(self.replace, traversal)
+        return block if rewritten == traversal else Reference(rewritten)
+
+    def value(self, value: Any) -> Any:
+        """Return value with references to other shards rewritten, copying nested blocks."""
+        if isinstance(value, Block):
+            return self.block(value) if value.attributes else self.reference(value)
+        if isinstance(value, Reference):
+            return Reference(ADDRESS.sub(self.replace, str(value)))
+        if isinstance(value, dict):
+            return {key: self.value(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.value(item) for item in value]
+        if isinstance(value, str) and '${' in value:
+            return TEMPLATE.sub(lambda match: ADDRESS.sub(self.replace, match[0]), value)
+        return value
+
+    def block(self, block: Block) -> Block:
+        """Return a copy of block with its values rewritten."""
+        copy = Block(block.kind, *block.labels)
+        copy.attributes = {key: self.value(value) for key, value in block.attributes.items()}
+        return copy
+
+
+def backend_of(blocks: Iterable[Block]) -> Block | None:
+    for block in blocks:
+        if block.kind == 'terraform' and isinstance(block.attributes.get('backend'), Block):
+            return block.attributes['backend']
+    return None
+
+
+def state_key(cona: str, shard: str) -> str:
+    return f'{cona}-{shard}.tfstate' if shard else f'{cona}.tfstate'
+
+
+def remote_state(cona: str, shard: str, owner: str, backend: Block | None) -> Block:
+    """Return a terraform_remote_state data block reading owner's state from shard's module."""
+    block = Block('data', 'terraform_remote_state', owner or 'main')
+    if backend is None:
+        path = f'{owner}/terraform.tfstate' if owner else 'terraform.tfstate'
+        block.attributes = {'backend': 'local', 'config': {'path': f'../{path}' if shard else path}}
+    else:
+        block.attributes = {
+            'backend': backend.labels[0],
+            'config': backend.attributes | {'key': state_key(cona, owner)},
+            'workspace': Reference('terraform.workspace'),
+        }
+    return block
+
+
+def needed_values(
+    blocks: list[Block], owners: Mapping[str, str], names: list[str]
+) -> dict[str, set[str]]:
+    """Return the locals, variables, and data sources each shard reads, directly or transitively."""
+    values = values_of(blocks)
+    dependencies = {name: reads(value) for name, (_, value) in values.items()}
+    roots: dict[str, set[str]] = {name: set() for name in names}
+    for block in blocks:
+        if block.kind in SHARDED_KINDS:
+            roots[owners[address(block)]] |= reads(block)
+        elif block.kind not in SHARED_KINDS | VALUE_KINDS.keys() | TARGET_KINDS.keys():
+            roots[MAIN] |= reads(block)
+    needed = {name: closure(roots[name], dependencies) for name in names}
+    # main.tf keeps values no shard reads, as they would be before sharding
+    unread = values.keys() - set().union(*needed.values())
+    needed[MAIN] |= closure(unread, dependencies)
+    return needed
+
+
+def placements(
+    block: Block, owners: Mapping[str, str], needed: Mapping[str, set[str]]
+) -> Iterator[tuple[str, Block]]:
+    """Yield (shard, block) for each shard block belongs in, with locals trimmed to those read."""
+    if block.kind in SHARDED_KINDS:
+        yield owners[address(block)], block
+    elif block.kind in SHARED_KINDS:
+        for name in needed:
+            yield name, block
+    elif block.kind == 'locals':
+        for name, values in needed.items():
+            if kept := {
+                key: item for key, item in block.attributes.items() if f'local.{key}' in values
+            }:
+                trimmed = Block('locals')
+                trimmed.attributes = kept
+                yield name, trimmed
+    elif block.kind in VALUE_KINDS:
+        value = '.'.join((VALUE_KINDS[block.kind], *block.labels))
+        yield from ((name, block) for name, values in needed.items() if value in values)
+    elif block.kind in TARGET_KINDS:
+        yield target(block, owners), block
+    else:
+        yield MAIN, block
+
+
+def split(blocks: list[Block], shard: Shard, cona: str) -> dict[str, list[Block]]:
+    """Return each shard's blocks, keyed by shard name, with MAIN for main.tf first."""
+    owners = {
+        address(block): shard(block) or MAIN for block in blocks if block.kind in SHARDED_KINDS
+    }
+    names = [MAIN, *sorted(set(owners.values()) - {MAIN})]
+    needed = needed_values(blocks, owners, names)
+    backend = backend_of(blocks)
+    rewriters = {name: Rewriter(name, owners) for name in names}
+    shards: dict[str, list[Block]] = {name: [] for name in names}
+    for block in blocks:
+        for name, placed in placements(block, owners, needed):
+            # Addresses in moved, import, and removed blocks are within their shard's state
+            shards[name].append(
+                placed if placed.kind in TARGET_KINDS else rewriters[name].block(placed)
+            )
+    check_acyclic({name: rewriter.outputs.keys() for name, rewriter in rewriters.items()})
+    exported: dict[str, set[str]] = {name: set() for name in names}
+    for name, rewriter in rewriters.items():
+        copied_backend = backend_of(shards[name])
+        if copied_backend is not None:
+            copied_backend.attributes['key'] = state_key(cona, name)
+        for owner, outputs in rewriter.outputs.items():
+            shards[name].append(remote_state(cona, name, owner, backend))
+            for output_name, expression in outputs.items():
+                if output_name not in exported[owner]:
+                    exported[owner].add(output_name)
+                    output = Block('output', output_name)
+                    output.attributes = {'value': Reference(expression)}
+                    shards[owner].append(output)
+    return shards
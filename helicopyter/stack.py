@@ -0,0 +1,145 @@
+"""Build Terraform configuration with cdktf constructs, which start the JSII Node.js runtime."""
+
+from collections.abc import Iterable, Mapping
+from importlib import import_module
+from sys import modules
+from time import perf_counter
+from types import ModuleType
+from typing import Any, TypeVar
+
+from cdktf import App, TerraformElement, TerraformStack
+from constructs import Construct, Node
+
+# ruff: noqa: T201
+# Element classes by path, like cloudflare.workers_route, for every codename in this process
+elements: dict[str, type[TerraformElement]] = {}
+
+
+class HeliStack(TerraformStack):
+    def __init__(self, cona: str) -> None:
+        # Something is automatically creating outdir, which is cdktf.out by default
+        super().__init__(App(outdir='.'), cona)
+
+        self.cona = cona
+        # Seconds spent importing each provider module this process had not imported before
+        self.imports: dict[str, float] = {}
+        self.pushes = 0
+        self._scopes: dict[str, Construct] = {}
+
+    def _allocate_logical_id(self, tf_element: Node | TerraformElement) -> str:
+        if isinstance(tf_element, Node):
+            # Mostly for mypy. Patches to support AWS CDK welcome.
+            raise TypeError('AWS CDK unsupported; please use CDKTF')  # pragma:no cover
+        return tf_element.node.id
+
+    def override(self, **kwargs: Any) -> None:
+        """Call add_override for each keyword argument."""
+        for key, value in kwargs.items():
+            self.add_override(key, value)
+
+    def provide(self, name: str, **kwargs: Any) -> type[TerraformElement]:
+        """
+        Return a Provider class instance given its short name.
+
+        Example usage:
+        stack.provide('github', owner='biobuddies')
+        """
+        module = self._import(f'cdktf_cdktf_provider_{name}.provider')
+        return getattr(module, f'{name.title()}Provider')(self, 'this', **kwargs)
+
+    def element(self, path: str) -> type[TerraformElement]:
+        """
+        Return the Element class for a path like 'cloudflare.workers_route', importing it once.
+
+        The class is named after the path's last part, so 'cloudflare.data_cloudflare_zone' is
+        DataCloudflareZone from cdktf_cdktf_provider_cloudflare.data_cloudflare_zone.
+        """
+        if path not in elements:
+            provider, _, submodule = path.partition('.')
+            module = self._import(f'cdktf_cdktf_provider_{provider}.{submodule}')
+            class_name = ''.join(part.title() for part in submodule.split('_'))
+            elements[path] = getattr(module, class_name)
+        return elements[path]
+
+    def _import(self, name: str) -> ModuleType:
+        """Import a provider module, recording the seconds spent if this process had not yet."""
+        if name not in modules:
+            started = perf_counter()
+            import_module(name)
+            self.imports[name] = perf_counter() - started
+        return modules[name]
+
+    E = TypeVar('E', bound=TerraformElement)
+
+    def push(
+        self,
+        Element: type[E] | str,  # noqa: N803
+        id_: str,
+        *args: Any,
+        **kwargs: Any,
+    ) -> E:
+        """
+        Return new instance of Element (data, local, output, resource, or variable).
+
+        In contrast to running Element(...) standalone, the new instance will be named in the
+        traditional Terraform style. Element may be a path for element(), so that its provider
+        is imported only when used.
+
+        Also assigns Element.__str__ to Element.to_string.
+
+        Example usage:
+        from cdktf_cdktf_provider_cloudflare.zero_trust_access_application import (
+            ZeroTrustAccessApplication
+        )
+        stack.push(ZeroTrustAccessApplication, 'mydomain-wildcard', domain='*.mydomain.com')
+        stack.push('cloudflare.workers_route', 'api', pattern='api.mydomain.com/*')
+        """
+        if isinstance(Element, str):
+            Element = self.element(Element)  # type: ignore[assignment]  # noqa: N806
+        scope = self._scope(Element)
+        print(f'Pushing {scope.node.id}.{id_}')
+        self.pushes += 1
+        return Element(scope, id_, *args, **kwargs)
+
+    def push_many(
+        self,
+        Element: type[E] | str,  # noqa: N803
+        rows: Iterable[Mapping[str, Any]],
+        id_key: str = 'id_',
+        defaults: Mapping[str, Any] | None = None,
+    ) -> list[E]:
+        """
+        Return a new instance of Element per row, named row[id_key], with defaults under each row.
+
+        Like push for each row, with row[id_key] removed from the keyword arguments, but patching
+        Element and finding its scope once.
+
+        Example usage:
+        stack.push_many(Membership, rows, defaults={'role': 'member'})
+        """
+        if isinstance(Element, str):
+            Element = self.element(Element)  # type: ignore[assignment]  # noqa: N806
+        scope = self._scope(Element)
+        shared = dict(defaults or {})
+        pushed = []
+        for row in rows:
+            kwargs = shared | row
+            pushed.append(Element(scope, kwargs.pop(id_key), **kwargs))
+        print(f'Pushing {len(pushed)} {scope.node.id}')
+        self.pushes += len(pushed)
+        return pushed
+
+    def _scope(self, Element: type[TerraformElement]) -> Construct:  # noqa: N803
+        """Return the Construct named after Element's module, also making str(element) work."""
+        # assignment: mypy thinks narrow type on one side and broad object type on the other are
+        # incompatible
+        # method-assign: mypy can't handle it https://github.com/python/mypy/issues/2427
+        Element.__str__ = Element.to_string  # type: ignore[assignment,method-assign]
+
+        if Element.__module__ == 'cdktf':
+            scope_name = Element.__name__.lower().replace('terraform', '')
+        else:
+            scope_name = Element.__module__.replace('cdktf_cdktf_provider_', '').replace('.', '_')
+        if scope_name not in self._scopes:
+            self._scopes[scope_name] = Construct(self, scope_name)
+        return self._scopes[scope_name]
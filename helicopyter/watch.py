@@ -0,0 +1,167 @@
+"""
+Synthesize again whenever a Python file a codename depends on changes.
+
+Changes come from Linux's inotify, or from polling modification times elsewhere. A burst of saves
+is collected until the tree is quiet for DEBOUNCE seconds, then only the codenames importing a
+changed file are synthesized, in this process, with cdktf and providers still loaded.
+"""
+
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import suppress
+from ctypes import CDLL, get_errno
+from itertools import chain
+from os import O_CLOEXEC, fsencode, read, walk
+from pathlib import Path
+from select import select
+from struct import calcsize, unpack_from
+from sys import stdout
+from time import monotonic, sleep
+from traceback import print_exc
+from typing import Any
+
+from helicopyter import multisynth, select_conas
+from helicopyter.affected import affected_conas
+from helicopyter.serve import forget_local_modules
+
+# ruff: noqa: T201
+DEBOUNCE = 0.2  # seconds
+POLL_INTERVAL = 0.25  # seconds
+# From sys/inotify.h
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_ISDIR = 0x40000000
+EVENT = 'iIII'  # Watch descriptor, mask, cookie, name length
+
+Wait = Callable[[float | None], set[Path]]
+
+
+def directories(top_directory: Path) -> Iterator[Path]:
+    """Yield top_directory and its subdirectories, except hidden ones and __pycache__."""
+    for directory, names, _ in walk(top_directory):
+        names[:] = [name for name in names if not name.startswith(('.', '__pycache__'))]
+        yield Path(directory)
+
+
+def modification_times(top_directory: Path) -> dict[Path, int]:
+    times = {}
+    for directory in directories(top_directory):
+        for path in directory.glob('*.py'):
+            try:
+                times[path] = path.stat().st_mtime_ns
+            except FileNotFoundError:
+                continue
+    return times
+
+
+def polling_waiter(top_directory: Path) -> Wait:
+    times = modification_times(top_directory)
+
+    def wait(timeout: float | None) -> set[Path]:
+        nonlocal times
+        deadline = None if timeout is None else monotonic() + timeout
+        while deadline is None or monotonic() < deadline:
+            sleep(POLL_INTERVAL if deadline is None else min(POLL_INTERVAL, timeout or 0))
+            current = modification_times(top_directory)
+            changed = {
+                path
+                for path in times.keys() | current.keys()
+                if times.get(path) != current.get(path)
+            }
+            times = current
+            if changed:
+                return changed
+        return set()
+
+    return wait
+
+
+def parse_events(events: bytes) -> Iterator[tuple[int, int, str]]:
+    """Yield (watch descriptor, mask, name) of each struct inotify_event."""
+    offset = 0
+    while offset < len(events):
+        watch, mask, _, length = unpack_from(EVENT, events, offset)
+        offset += calcsize(EVENT)
+        yield watch, mask, events[offset : offset + length].rstrip(b'\0').decode()
+        offset += length
+
+
+def add_watches(libc: CDLL, descriptor: int, watched: dict[int, Path], top: Path) -> set[Path]:
+    """Watch top and its subdirectories; return Python files already in them."""
+    mask = IN_CLOSE_WRITE | IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+    found = set()
+    for directory in directories(top):
+        if (watch := libc.inotify_add_watch(descriptor, fsencode(directory), mask)) >= 0:
+            watched[watch] = directory
+        found.update(directory.glob('*.py'))
+    return found
+
+
+def inotify_waiter(top_directory: Path) -> Wait | None:
+    """Return a Wait using inotify, or None where it is unavailable."""
+    try:
+        libc = CDLL(None, use_errno=True)
+        descriptor = libc.inotify_init1(O_CLOEXEC)
+    except (AttributeError, OSError):
+        return None
+    if descriptor < 0:
+        print(f'inotify_init1 failed with errno {get_errno()}; polling instead')
+        return None
+    watched: dict[int, Path] = {}
+    add_watches(libc, descriptor, watched, top_directory)
+
+    def wait(timeout: float | None) -> set[Path]:
+        if not select([descriptor], [], [], timeout)[0]:
+            return set()
+        changed = set()
+        for watch, event_mask, name in parse_events(read(descriptor, 64 * 1024)):
+            if watch not in watched:
+                continue
+            path = watched[watch] / name
+            if event_mask & IN_ISDIR:
+                # Files may be written before the new directory is watched
+                if event_mask & (IN_CREATE | IN_MOVED_TO) and not name.startswith(('.', '__')):
+                    changed.update(add_watches(libc, descriptor, watched, path))
+            elif name.endswith('.py'):
+                changed.add(path)
+        return changed
+
+    return wait
+
+
+def debounced(wait: Wait) -> Iterator[set[Path]]:
+    """Yield the files changed in each burst, once none change for DEBOUNCE seconds."""
+    while True:
+        changed = wait(None)
+        while more := wait(DEBOUNCE):
+            changed |= more
+        yield changed
+
+
+def watch(
+    all_or_conas_or_paths: Iterable[str], *, change_directory: Path | None, **options: Any
+) -> None:
+    """Synthesize all_or_conas_or_paths, then each affected codename after every change."""
+    top_directory = (change_directory or Path.cwd()).resolve()
+    wait = inotify_waiter(top_directory) or polling_waiter(top_directory)
+    conas = select_conas(all_or_conas_or_paths, top_directory)
+    print(f'Watching {top_directory}', flush=True)
+    with suppress(KeyboardInterrupt):
+        for changed in chain([set()], debounced(wait)):
+            if changed:
+                forget_local_modules(top_directory)
+                # Select again so that deploys added since count for `all`
+                conas = affected_conas(
+                    top_directory, select_conas(all_or_conas_or_paths, top_directory), changed
+                )
+                if not conas:
+                    continue
+                relative_paths = sorted(str(path.relative_to(top_directory)) for path in changed)
+                print(f'Changed {", ".join(relative_paths)}')
+            try:
+                multisynth(conas, change_directory=top_directory, **options)
+            except Exception:  # noqa: BLE001
+                print_exc()
+            stdout.flush()
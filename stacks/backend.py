@@ -0,0 +1,26 @@
+"""R2 backend for pure-Python Block deploys, importable without cdktf."""
+
+from helicopyter import Block
+
+
+def r2_backend(cona: str, terraform: Block) -> None:
+    """Register a terraform block with R2/S3 backend.
+
+    R2 backend requires the following environment variables.
+
+    AWS_ACCESS_KEY_ID     - R2 token
+    AWS_SECRET_ACCESS_KEY - R2 secret
+    AWS_ENDPOINT_URL_S3   - R2 location: https://ACCOUNT_ID.r2.cloudflarestorage.com
+    """
+    terraform.backend('s3')(
+        bucket='terraform',
+        key=f'{cona}.tfstate',
+        region='auto',
+        workspace_key_prefix=cona,
+        skip_credentials_validation='true',
+        skip_metadata_api_check='true',
+        skip_region_validation='true',
+        skip_requesting_account_id='true',
+        skip_s3_checksum='true',
+        use_path_style='true',
+    )
@@ -2,30 +2,8 @@
 
 from cdktf import S3Backend
 
-from helicopyter import Block, HeliStack
-
-
-def r2_backend(cona: str, terraform: Block) -> None:
-    """Register a terraform block with R2/S3 backend.
-
-    R2 backend requires the following environment variables.
-
-    AWS_ACCESS_KEY_ID     - R2 token
-    AWS_SECRET_ACCESS_KEY - R2 secret
-    AWS_ENDPOINT_URL_S3   - R2 location: https://ACCOUNT_ID.r2.cloudflarestorage.com
-    """
-    terraform.backend('s3')(
-        bucket='terraform',
-        key=f'{cona}.tfstate',
-        region='auto',
-        workspace_key_prefix=cona,
-        skip_credentials_validation='true',
-        skip_metadata_api_check='true',
-        skip_region_validation='true',
-        skip_requesting_account_id='true',
-        skip_s3_checksum='true',
-        use_path_style='true',
-    )
+from helicopyter import HeliStack
+from stacks.backend import r2_backend  # noqa: F401  # Re-exported for older deploys
 
 
 class BaseStack(HeliStack):
@@ -0,0 +1,16 @@
+"""Compare quick benchmarks against benchmark_baseline.json."""
+
+from json import loads
+
+from benchmark_helicopyter import BASELINE, calibrate, compare, run
+
+
+def test_benchmarks_within_thresholds() -> None:
+    baseline = loads(BASELINE.read_text())
+    calibration = calibrate()
+    failures = [
+        message
+        for name, seconds in run('quick')
+        if (message := compare(name, seconds, baseline, calibration))
+    ]
+    assert not failures
@@ -0,0 +1,151 @@
+"""Test the builtin formatter against a corpus of `terraform fmt` results."""
+
+from pathlib import Path
+from shutil import which
+from subprocess import check_output
+
+from pytest import mark, skip
+
+from helicopyter import multisynth
+from helicopyter.formatting import format_hcl
+
+corpus = (
+    ('locals {\na = 1\nbbb = 2\n}\n', 'locals {\n  a   = 1\n  bbb = 2\n}\n'),
+    ('locals {\n  a = 1\n\n  bbb = 2\n}\n', 'locals {\n  a = 1\n\n  bbb = 2\n}\n'),
+    (
+        (
+            'resource "null_resource" "this" {\n'
+            'triggers = {\n'
+            'cona = local.cona\n'
+            'environment = local.envi\n'
+            '}\n'
+            'count = 1\n'
+            '}\n'
+        ),
+        (
+            'resource "null_resource" "this" {\n'
+            '  triggers = {\n'
+            '    cona        = local.cona\n'
+            '    environment = local.envi\n'
+            '  }\n'
+            '  count = 1\n'
+            '}\n'
+        ),
+    ),
+    (
+        'terraform {\nbackend "s3" {\nbucket = "terraform"\nkey = "cona.tfstate"\n}\n}\n',
+        (
+            'terraform {\n  backend "s3" {\n    bucket = "terraform"\n    key    = "cona.tfstate"\n'
+            '  }\n}\n'
+        ),
+    ),
+    (
+        'locals {\na = 1 # one\nbbb = 22 # two\n}\n',
+        'locals {\n  a   = 1  # one\n  bbb = 22 # two\n}\n',
+    ),
+    (
+        'locals {\n# comment\nequal = a == b\nnot_equal = "a={" != b\n}\n',
+        'locals {\n  # comment\n  equal     = a == b\n  not_equal = "a={" != b\n}\n',
+    ),
+    ('locals {\nx = "${local.a}}"\n}\n', 'locals {\n  x = "${local.a}}"\n}\n'),
+    (
+        'locals {\npolicy = <<EOT\n  {"a": 1}\nEOT\n}\n',
+        'locals {\n  policy = <<EOT\n  {"a": 1}\nEOT\n}\n',
+    ),
+    (
+        'locals {\nlist = [\n"a",\n"b",\n]\n}\n',
+        'locals {\n  list = [\n    "a",\n    "b",\n  ]\n}\n',
+    ),
+    # cdktf writes references as interpolation-only templates, which `terraform fmt` unwraps
+    (
+        'locals {\ncona = "demo"\nenvi = "${terraform.workspace}"\n}\n',
+        'locals {\n  cona = "demo"\n  envi = terraform.workspace\n}\n',
+    ),
+    ('output "giha" {\nvalue = "${var.giha}"\n}\n', 'output "giha" {\n  value = var.giha\n}\n'),
+    (
+        (
+            'resource "null_resource" "this" {\n'
+            'id = "${local.a}-${local.b}"\n'
+            'joined = "${join(",", local.list)}"\n'
+            'triggers = {\n'
+            'cona = "${local.cona}"\n'
+            '}\n'
+            'lifecycle {\n'
+            'replace_triggered_by = "${local.replaced}"\n'
+            '}\n'
+            '}\n'
+        ),
+        (
+            'resource "null_resource" "this" {\n'
+            '  id     = "${local.a}-${local.b}"\n'
+            '  joined = join(",", local.list)\n'
+            '  triggers = {\n'
+            '    cona = "${local.cona}"\n'
+            '  }\n'
+            '  lifecycle {\n'
+            '    replace_triggered_by = local.replaced\n'
+            '  }\n'
+            '}\n'
+        ),
+    ),
+)
+
+
+@mark.parametrize(('unformatted', 'formatted'), corpus)
+def test_format_hcl(unformatted: str, formatted: str) -> None:
+    assert format_hcl(unformatted) == formatted
+    assert format_hcl(formatted) == formatted
+
+
+@mark.parametrize('format_with', ('terraform', 'tofu'))
+@mark.parametrize(('unformatted', 'formatted'), corpus)
+def test_format_hcl_conformance(unformatted: str, formatted: str, format_with: str) -> None:
+    if not which(format_with):
+        skip(f'{format_with} not installed')
+    assert check_output([format_with, 'fmt', '-'], input=unformatted.encode()).decode() == (  # noqa: S603
+        formatted
+    )
+
+
+@mark.parametrize('path', sorted(Path('deploys').glob('*/terraform/main.tf')))
+def test_format_hcl_generated(path: Path) -> None:
+    """Files formatted by `terraform fmt` are fixed points, even after stripping indentation."""
+    formatted = path.read_text()
+    assert format_hcl(formatted) == formatted
+    assert format_hcl('\n'.join(line.strip() for line in formatted.splitlines())) == formatted
+
+
+@mark.parametrize('cona', ('classdemo', 'demo', 'demo_hcl'))
+def test_multisynth_builtin(tmp_path: Path, cona: str) -> None:
+    """Output of Block deploys and of cdktf's to_hcl_terraform matches `terraform fmt`'s."""
+    relative_path = Path('deploys') / cona / 'terraform' / 'main.tf'
+    (tmp_path / relative_path).parent.mkdir(parents=True)
+    multisynth(
+        [cona],
+        change_directory=tmp_path,
+        format_with='builtin',
+        hashicorp_configuration_language=True,
+    )
+    assert (tmp_path / relative_path).read_text() == relative_path.read_text()
+
+
+@mark.parametrize('format_with', ('terraform', 'tofu'))
+def test_multisynth_batch_format(tmp_path: Path, format_with: str) -> None:
+    if not which(format_with):
+        skip(f'{format_with} not installed')
+    for directory, batch_format in (('each', False), ('batch', True)):
+        for cona in ('demo_hcl', 'foundation'):
+            (tmp_path / directory / 'deploys' / cona / 'terraform').mkdir(parents=True)
+        multisynth(
+            ['demo_hcl', 'foundation'],
+            batch_format=batch_format,
+            change_directory=tmp_path / directory,
+            format_with=format_with,
+            hashicorp_configuration_language=True,
+            jobs=2,
+        )
+    for cona in ('demo_hcl', 'foundation'):
+        relative_path = Path('deploys') / cona / 'terraform' / 'main.tf'
+        assert (tmp_path / 'batch' / relative_path).read_text() == (
+            tmp_path / 'each' / relative_path
+        ).read_text()
@@ -1,26 +1,57 @@
 """Test the helicopyter module."""
 
+from collections.abc import Callable, Iterator
+from importlib import import_module
+from json import dumps as json_dumps
+from json import loads as json_loads
+from os import environ
+from pathlib import Path
+from pickle import dumps, loads
+from signal import SIGINT
+from subprocess import PIPE, Popen, check_output, run
+from sys import executable
+from threading import Timer
+from types import SimpleNamespace
+
 from cdktf import TerraformLocal, TerraformOutput, TerraformVariable
 from cdktf_cdktf_provider_null.resource import Resource as NullResource
-from pytest import raises
+from pytest import CaptureFixture, MonkeyPatch, mark, raises
 
 from helicopyter import (
     Block,
     HeliStack,
+    Reference,
+    autoformat,
     data,
+    iter_hcl,
     local,
+    multisynth,
     number,
     provider,
     quote,
     registry,
+    render,
     resource,
+    select_conas,
     string,
     tbool,
     terraform,
+    terraform_json,
+    tidy,
     tlocals,
     var,
     variable,
 )
+from helicopyter.bindings import write_bindings
+from helicopyter.cache import fingerprint, is_fresh, record
+from helicopyter.compact import compact
+from helicopyter.diff import compare, diff, read_index
+from helicopyter.output import json_chunks, write_if_changed
+from helicopyter.profile import peak_bytes
+from helicopyter.serve import request
+from helicopyter.sharding import by_type, split
+from helicopyter.stack import elements
+from helicopyter.watch import Wait, debounced, inotify_waiter, polling_waiter
 
 
 def test_helistack() -> None:
@@ -52,6 +83,35 @@ def test_push_id() -> None:
         stack.push(NullResource, 'bar')
 
 
+def test_push_many() -> None:
+    stack = HeliStack('foo')
+    nulls = stack.push_many(
+        NullResource,
+        ({'id_': f'this{index}', 'triggers': {'index': str(index)}} for index in range(3)),
+        defaults={'triggers': {'index': 'default'}, 'count': 1},
+    )
+    assert [str(null) for null in nulls] == [f'foo/null_resource/this{index}' for index in range(3)]
+    assert stack.pushes == 3
+    resources = stack.to_terraform()['resource']['null_resource']
+    assert resources['this2']['count'] == 1
+    assert resources['this2']['triggers'] == {'index': '2'}
+
+
+def test_push_path() -> None:
+    """Elements named by path are imported on first use and shared by later stacks."""
+    stack = HeliStack('foo')
+    lazy = stack.push('null.resource', 'lazy', triggers={'a': 'b'})
+    data_sources = stack.push_many('null.data_null_data_source', [{'id_': 'this'}])
+    assert isinstance(lazy, NullResource)
+    assert str(lazy) == 'foo/null_resource/lazy'
+    assert [str(data_source) for data_source in data_sources] == [
+        'foo/null_data_null_data_source/this'
+    ]
+    assert stack.imports.keys() <= {'cdktf_cdktf_provider_null.data_null_data_source'}
+    assert elements['null.resource'] is NullResource
+    assert HeliStack('bar').element('null.resource') is NullResource
+
+
 def test_push_provider() -> None:
     """The same id_ must be allowed for different Elements."""
     stack = HeliStack('foo')
@@ -72,6 +132,25 @@ def test_ref_str() -> None:
     assert str(number) == 'number'
 
 
+def test_reference_interned() -> None:
+    assert local.cona is local.cona
+    assert var.giha is Reference('var.giha')
+    assert loads(dumps(local.cona)) is local.cona  # noqa: S301
+    assert repr(local.cona) == "Reference('local.cona')"
+    with raises(AttributeError):
+        local.cona = 'demo'
+    with raises(AttributeError):
+        _ = local.__deepcopy__
+
+
+def test_block_slots() -> None:
+    """Prototypes assigned as attributes are kept without a per-instance __dict__."""
+    assert not hasattr(Block('string'), '__dict__')
+    assert isinstance(terraform.backend, Block)
+    assert terraform.backend is terraform.backend
+    assert terraform.workspace is not terraform.workspace
+
+
 def test_block_str() -> None:
     assert str(resource.null_resource.this) == 'resource.null_resource.this'
     assert str(data.github_repository.helicopyter) == 'data.github_repository.helicopyter'
@@ -196,14 +275,7 @@ def test_multisynth_filters_children() -> None:
     """Blocks that are attr values in other blocks only render nested."""
     terraform.backend('s3')(bucket='tf', key='cona.tfstate', region='auto')
     terraform.required_providers(github={'source': 'integrations/github', 'version': '~> 6.0'})
-    children = {
-        id(value)
-        for block in registry
-        for value in block.attributes.values()
-        if isinstance(value, Block) and value.attributes
-    }
-    top_level = [b for b in registry if id(b) not in children]
-    hcl = '\n\n'.join(b.to_hcl() for b in top_level)
+    hcl = '\n\n'.join(b.to_hcl() for b in registry.top_level())
     registry.clear()
     assert hcl.startswith('terraform {')
     assert hcl.count('backend "s3" {') == 1
@@ -212,6 +284,379 @@ def test_multisynth_filters_children() -> None:
     assert '  required_providers {' in hcl
 
 
+def test_registry_merges_repeated_address() -> None:
+    terraform.required_providers(github={'source': 'integrations/github'})
+    terraform.required_providers(null={'source': 'hashicorp/null'})
+    resource.null_resource.this(count=1)
+    resource.null_resource.this(triggers={'cona': local.cona})
+    hcl = '\n\n'.join(block.to_hcl() for block in registry.top_level())
+    registry.clear()
+    assert hcl.count('required_providers {') == 1
+    assert '    github = {' in hcl
+    assert '    null = {' in hcl
+    assert hcl.count('resource "null_resource" "this" {') == 1
+    assert '  count = "1"' in hcl
+    assert '  triggers = {' in hcl
+
+
+def test_bulk_matches_calls() -> None:
+    """Bulk registration emits what one call per row would, merging repeated addresses."""
+    rows = [{'name': f'this{index}', 'triggers': {'index': index}} for index in range(3)]
+    rows.append({'name': 'this0', 'count': 2})
+    defaults = {'count': 1, 'triggers': {'index': 'default'}}
+    hcls = []
+    for register in (
+        lambda: [resource.null_resource(row['name'])(**defaults | row) for row in rows],
+        lambda: resource.null_resource.bulk(rows, defaults=defaults),
+    ):
+        blocks = register()
+        hcls.append(''.join(iter_hcl(registry.top_level())))
+        registry.clear()
+    assert hcls[0] == hcls[1]
+    assert blocks[0] is blocks[3]
+    # Defaults apply under each row, including repeats
+    assert blocks[0].attributes == {'count': 2, 'name': 'this0', 'triggers': {'index': 'default'}}
+    # Or the label key is only a label
+    blocks = resource.null_resource.bulk(rows, defaults=defaults, keep_label_key=False)
+    registry.clear()
+    assert blocks[0].attributes == {'count': 2, 'triggers': {'index': 'default'}}
+
+
+def test_bulk_nested() -> None:
+    terraform.backend.bulk([{'name': 's3', 'bucket': 'terraform'}])
+    hcl = ''.join(iter_hcl(registry.top_level()))
+    registry.clear()
+    assert hcl == 'terraform {\n  backend "s3" {\n    bucket = "terraform"\n  }\n}'
+
+
+def test_compact() -> None:
+    """Similar resources share a for_each block unless referenced, too few, or all different."""
+    resource.aws_instance.bulk(
+        ({'name': f'web{index}'} for index in range(3)), defaults={'ami': 'ami-1'}
+    )
+    resource.null_resource.bulk(
+        ({'name': f'cona{index}'} for index in range(3)), defaults={'triggers': local.cona}
+    )
+    resource.null_resource.referenced(triggers={'id': '${null_resource.cona0.id}'})
+    resource.random_id.bulk({'name': f'key{index}', 'byte_length': index} for index in range(3))
+    blocks = compact(registry.top_level())
+    json = terraform_json(blocks)
+    registry.clear()
+    assert [str(block) for block in blocks] == [
+        'locals',
+        'resource.aws_instance.this',
+        *['moved'] * 3,
+        *[f'resource.null_resource.{name}' for name in ('cona0', 'cona1', 'cona2', 'referenced')],
+        *[f'resource.random_id.key{index}' for index in range(3)],
+    ]
+    assert blocks[0].to_hcl() == (
+        'locals {\n'
+        '  aws_instance_this = {\n'
+        '    web0 = {\n      name = "web0"\n    }\n'
+        '    web1 = {\n      name = "web1"\n    }\n'
+        '    web2 = {\n      name = "web2"\n    }\n'
+        '  }\n'
+        '}'
+    )
+    assert blocks[1].to_hcl() == (
+        'resource "aws_instance" "this" {\n'
+        '  for_each = local.aws_instance_this\n'
+        '  ami = "ami-1"\n'
+        '  name = each.value.name\n'
+        '}'
+    )
+    assert blocks[2].to_hcl() == (
+        'moved {\n  from = aws_instance.web0\n  to = aws_instance.this["web0"]\n}'
+    )
+    assert json['moved'][0] == {'from': 'aws_instance.web0', 'to': 'aws_instance.this["web0"]'}
+
+
+def test_split() -> None:
+    """Each shard has its own state key and reads other shards' resources from their outputs."""
+    terraform.backend('s3')(bucket='terraform', key='sharded.tfstate', region='auto')
+    provider.null()
+    resource.null_resource.a(
+        triggers={'hex': resource.random_id.b.hex, 'id': '${random_id.b.id}-${null_resource.c.id}'}
+    )
+    resource.random_id.b(byte_length=4)
+    resource.null_resource.c(
+        triggers={'hex': Reference('random_id.b.hex'), 'result': data.external.d.result}
+    )
+    data.external.d(program=['true'])
+    shards = split(registry.top_level(), by_type, 'sharded')
+    registry.clear()
+    assert {name: [str(block) for block in blocks] for name, blocks in shards.items()} == {
+        '': ['terraform', 'provider.null'],
+        'null_resource': [
+            'terraform',
+            'provider.null',
+            'resource.null_resource.a',
+            'resource.null_resource.c',
+            'data.external.d',
+            'data.terraform_remote_state.random_id',
+        ],
+        'random_id': [
+            'terraform',
+            'provider.null',
+            'resource.random_id.b',
+            'output.random_id_b_hex',
+            'output.random_id_b_id',
+        ],
+    }
+    assert [blocks[0].attributes['backend'].attributes['key'] for blocks in shards.values()] == [
+        'sharded.tfstate',
+        'sharded-null_resource.tfstate',
+        'sharded-random_id.tfstate',
+    ]
+    a, c = shards['null_resource'][2:4]
+    assert a.to_hcl() == (
+        'resource "null_resource" "a" {\n'
+        '  triggers = {\n'
+        '    hex = data.terraform_remote_state.random_id.outputs.random_id_b_hex\n'
+        '    id = "${data.terraform_remote_state.random_id.outputs.random_id_b_id}'
+        '-${null_resource.c.id}"\n'
+        '  }\n'
+        '}'
+    )
+    assert str(c.attributes['triggers']['hex']) == (
+        'data.terraform_remote_state.random_id.outputs.random_id_b_hex'
+    )
+    assert shards['null_resource'][-1].attributes['config']['key'] == 'sharded-random_id.tfstate'
+    assert shards['random_id'][-2].to_hcl() == (
+        'output "random_id_b_hex" {\n  value = random_id.b.hex\n}'
+    )
+
+
+def test_split_compact() -> None:
+    """Moved blocks go, with their addresses unchanged, to the shard of the resource they name."""
+    terraform.backend('s3')(bucket='terraform', key='sharded.tfstate', region='auto')
+    for index in range(3):
+        resource.random_id(f'key{index}')(byte_length=4, keepers={'index': str(index)})
+    resource.null_resource.a(triggers={'id': 'a'})
+    shards = split(compact(registry.top_level()), by_type, 'sharded')
+    registry.clear()
+    assert {name: [str(block) for block in blocks] for name, blocks in shards.items()} == {
+        '': ['terraform'],
+        'null_resource': ['terraform', 'resource.null_resource.a'],
+        'random_id': ['terraform', 'locals', 'resource.random_id.this', *['moved'] * 3],
+    }
+    assert shards['random_id'][3].to_hcl() == (
+        'moved {\n  from = random_id.key0\n  to = random_id.this["key0"]\n}'
+    )
+
+
+def test_split_locals() -> None:
+    """Locals go only to shards reading them, so main.tf reading shards is not read back."""
+    resource.random_id.b(byte_length=4)
+    resource.null_resource.a(triggers={'id': resource.random_id.b.hex, 'x': local.y})
+    tlocals(x=resource.null_resource.a.id, y='constant', z=local.x)
+    variable.giha(type=string)
+    shards = split(registry.top_level(), by_type, 'sharded')
+    registry.clear()
+    assert {name: [str(block) for block in blocks] for name, blocks in shards.items()} == {
+        '': ['locals', 'variable.giha', 'data.terraform_remote_state.null_resource'],
+        'null_resource': [
+            'resource.null_resource.a',
+            'locals',
+            'output.null_resource_a_id',
+            'data.terraform_remote_state.random_id',
+        ],
+        'random_id': ['resource.random_id.b', 'output.random_id_b_hex'],
+    }
+    assert list(shards[''][0].attributes) == ['x', 'z']
+    assert list(shards['null_resource'][1].attributes) == ['y']
+
+    resource.random_id.b(keepers={'x': local.x})
+    resource.null_resource.a(triggers={'id': resource.random_id.b.hex})
+    tlocals(x=resource.null_resource.a.id)
+    blocks = registry.top_level()
+    registry.clear()
+    with raises(ValueError, match='cycle: null_resource -> random_id -> null_resource'):
+        split(blocks, by_type, 'sharded')
+
+
+def test_bindings(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    """Generated blocks render like untyped ones but reject unknown and missing arguments."""
+    attributes = {
+        'id': {'type': 'string', 'computed': True},
+        'in': {'type': 'number', 'optional': True},
+        'pattern': {'type': 'string', 'required': True},
+        'zone_id': {'type': 'string', 'required': True},
+    }
+    schema = {
+        'provider_schemas': {
+            'registry.terraform.io/cloudflare/cloudflare': {
+                'resource_schemas': {
+                    'cloudflare_workers_route': {'block': {'attributes': attributes}}
+                },
+                'data_source_schemas': {
+                    'cloudflare_zone': {
+                        'block': {'attributes': {'name': {'type': 'string', 'optional': True}}}
+                    }
+                },
+            }
+        }
+    }
+    (tmp_path / 'schema.json').write_text(json_dumps(schema))
+    assert write_bindings(tmp_path / 'schema.json', tmp_path / 'generated') == [
+        tmp_path / 'generated' / 'cloudflare.py'
+    ]
+    source = (tmp_path / 'generated' / 'cloudflare.py').read_text()
+    assert 'class CloudflareWorkersRouteArguments(ResourceMeta, total=False):\n' in source
+    assert "    EXTRA = frozenset(('in',))\n" in source
+    monkeypatch.syspath_prepend(tmp_path)
+    cloudflare = import_module('generated.cloudflare')
+    cloudflare.resource.cloudflare_workers_route.api(pattern='api/*', zone_id=local.zone_id)
+    cloudflare.resource.cloudflare_workers_route.bulk(
+        [{'label': 'www', 'pattern': 'www/*'}],
+        label_key='label',
+        defaults={'zone_id': local.zone_id},
+        keep_label_key=False,
+    )
+    cloudflare.data.cloudflare_zone('main')(name='example.com')
+    cloudflare.resource.cloudflare_workers_route('a', pattern='a/*', zone_id='1')
+    cloudflare.resource.cloudflare_workers_route('b', pattern='b/*', zone_id='1')
+    assert cloudflare.resource.cloudflare_workers_route.labels == ('cloudflare_workers_route',)
+    with raises(TypeError, match=r'has no arguments zone$'):
+        cloudflare.resource.cloudflare_workers_route.bad(pattern='bad/*', zone_id='1', zone='1')
+    with raises(TypeError, match=r'requires arguments zone_id$'):
+        cloudflare.resource.cloudflare_workers_route.bulk([{'pattern': 'bad/*'}], 'pattern')
+    with raises(AttributeError):
+        cloudflare.resource.cloudflare_zone  # noqa: B018
+    hcl = ''.join(iter_hcl(registry.top_level()))
+    registry.clear()
+    assert hcl == (
+        'resource "cloudflare_workers_route" "api" {\n'
+        '  pattern = "api/*"\n'
+        '  zone_id = local.zone_id\n'
+        '}\n\n'
+        'resource "cloudflare_workers_route" "www" {\n'
+        '  zone_id = local.zone_id\n'
+        '  pattern = "www/*"\n'
+        '}\n\n'
+        'data "cloudflare_zone" "main" {\n'
+        '  name = "example.com"\n'
+        '}\n\n'
+        'resource "cloudflare_workers_route" "a" {\n'
+        '  pattern = "a/*"\n'
+        '  zone_id = "1"\n'
+        '}\n\n'
+        'resource "cloudflare_workers_route" "b" {\n'
+        '  pattern = "b/*"\n'
+        '  zone_id = "1"\n'
+        '}'
+    )
+
+
+def test_bindings_deterministic(tmp_path: Path) -> None:
+    """Generated source does not depend on hash randomization, so it does not churn in git."""
+    keywords = {name: {'type': 'string', 'optional': True} for name in ('in', 'from', 'is', 'for')}
+    (tmp_path / 'schema.json').write_text(
+        json_dumps(
+            {
+                'provider_schemas': {
+                    'registry.terraform.io/hashicorp/keywords': {
+                        'resource_schemas': {'keywords_all': {'block': {'attributes': keywords}}}
+                    }
+                }
+            }
+        )
+    )
+    for seed in ('1', '2', '3'):
+        check_output(  # noqa: S603
+            [
+                executable,
+                '-c',
+                (
+                    'from pathlib import Path; from helicopyter.bindings import write_bindings; '
+                    f'write_bindings(Path("schema.json"), Path("{seed}"))'
+                ),
+            ],
+            cwd=tmp_path,
+            env=environ | {'PYTHONHASHSEED': seed, 'PYTHONPATH': str(Path(__file__).parent)},
+        )
+    sources = {(tmp_path / seed / 'keywords.py').read_text() for seed in ('1', '2', '3')}
+    assert len(sources) == 1
+    assert "    EXTRA = frozenset(('for', 'from', 'in', 'is'))\n" in sources.pop()
+
+
+def test_render_stack_with_blocks() -> None:
+    """Blocks registered alongside a HeliStack join its output, so pushes can move over."""
+    stack = HeliStack('mixed')
+    stack.push(NullResource, 'pushed', triggers={'a': 'b'})
+    resource.null_resource.registered(triggers={'c': 'd'})
+    blocks = registry.top_level()
+    registry.clear()
+    dictionary = json_loads(
+        ''.join(render(blocks, stack, hashicorp_configuration_language=False, settle=list))
+    )
+    hcl = ''.join(render(blocks, stack, hashicorp_configuration_language=True, settle=list))
+    assert dictionary['resource']['null_resource'].keys() == {'pushed', 'registered'}
+    assert dictionary['//']['AUTOGENERATED'] == 'by helicopyter'
+    assert 'resource "null_resource" "pushed" {' in hcl
+    assert hcl.endswith(
+        'resource "null_resource" "registered" {\n  triggers = {\n    c = "d"\n  }\n}'
+    )
+
+
+def test_registry_keeps_distinct_blocks() -> None:
+    """Provider aliases have their own addresses; blocks like moved have none."""
+    provider.aws(region='us-east-1')
+    provider.aws(alias='west', region='us-west-2')
+    Block('moved')(from_=resource.null_resource.a, to=resource.null_resource.b)
+    Block('moved')(from_=resource.null_resource.a, to=resource.null_resource.b)
+    kinds = [block.kind for block in registry.top_level()]
+    registry.clear()
+    assert kinds == ['provider', 'provider', 'moved', 'moved']
+
+
+def test_registry_clear_detaches_children() -> None:
+    """Children attached to module-level prototypes must not leak into the next codename."""
+    terraform.backend('s3')(bucket='tf', key='first.tfstate')
+    registry.clear()
+    assert 'backend' not in terraform.attributes
+    terraform(required_version='>= 1.5')
+    hcl = '\n\n'.join(block.to_hcl() for block in registry.top_level())
+    registry.clear()
+    assert 'backend' not in hcl
+    assert len(registry) == 0
+
+
+def test_iter_hcl_streams_nested_values() -> None:
+    """Nesting deeper than the recursion limit is walked iteratively, in small chunks."""
+    deep: dict[str, object] = {'leaf': True}
+    for _ in range(2000):
+        deep = {'nest': [deep]}
+    resource.null_resource.this(triggers=deep)
+    chunks = list(iter_hcl(registry.top_level()))
+    registry.clear()
+    hcl = ''.join(chunks)
+    # The longest chunk is the indentation of the innermost values, 2 levels per nest
+    assert max(len(chunk) for chunk in chunks) < len(hcl) / 1000
+    assert hcl.startswith(
+        'resource "null_resource" "this" {\n  triggers = {\n    nest = [\n      {\n'
+    )
+    assert hcl.count('leaf = true') == 1
+
+
+def test_tidy() -> None:
+    chunks = ['\n  # AUTO', 'GENERATED\n\n\n\nlocals {\n', '  a = 1\n}\nresource "x" "y" {}\n\n']
+    assert ''.join(tidy(chunks)) == (
+        '# AUTOGENERATED\n\nlocals {\n  a = 1\n}\n\nresource "x" "y" {}\n'
+    )
+    assert ''.join(tidy(['  }\n\n\n}\n'])) == '}\n}\n'
+
+
+def test_tidy_keeps_heredocs() -> None:
+    """Blank lines and braces inside a heredoc are the user's script, not formatting."""
+    script = 'echo a\n\n\n\necho b\n}\n\n\n}\n'
+    resource.null_resource.this(triggers={'script': script})
+    hcl = ''.join(iter_hcl(registry.top_level()))
+    registry.clear()
+    assert f'<<EOT\n{script}EOT\n' in ''.join(autoformat([hcl], 'builtin'))
+    assert ''.join(tidy([f'a = <<EOT\n{script}EOT\n\n\n}}\n'])) == f'a = <<EOT\n{script}EOT\n\n}}\n'
+
+
 def test_boolean_unquoted() -> None:
     assert quote(True) == 'true'  # noqa: FBT003
     assert quote(False) == 'false'  # noqa: FBT003
@@ -221,6 +666,33 @@ def test_list_quoting() -> None:
     assert quote(['a', 'b', 3]) == '["a", "b", "3"]'
 
 
+def test_list_wrapping() -> None:
+    cidrs = [f'10.0.{index}.0/24' for index in range(1000)]
+    assert quote(cidrs, 1) == '[\n' + ''.join(f'    "{cidr}",\n' for cidr in cidrs) + '  ]'
+    assert quote([{'a': 1}], 0) == '[\n  {\n    a = "1"\n  },\n]'
+
+
+@mark.parametrize(
+    ('value', 'hcl'),
+    (
+        ('say "hi"\\', '"say \\"hi\\"\\\\"'),
+        ('tab\there\r\x01', '"tab\\there\\r\\u0001"'),
+        ('${local.cona}', '"${local.cona}"'),
+        ('no trailing newline\nhere', '"no trailing newline\\nhere"'),
+        ('{\n  "a": "\\\\"\n}\n', '<<EOT\n{\n  "a": "\\\\"\n}\nEOT'),
+        ('echo\nEOT\n', '<<EOT1\necho\nEOT\nEOT1'),
+    ),
+)
+def test_string_escaping(value: str, hcl: str) -> None:
+    assert quote(value) == hcl
+
+
+def test_object_keys() -> None:
+    assert quote({'Name': 1, 'aws:SourceIp': 2, 3: 4, local.key: 5}, 0) == (
+        '{\n  Name = "1"\n  "aws:SourceIp" = "2"\n  "3" = "4"\n  (local.key) = "5"\n}'
+    )
+
+
 def test_labels_plus_kwargs() -> None:
     """__call__ with both labels and kwargs mutates self in place."""
     block = terraform.backend('s3')(bucket='tf', key='x.tfstate')
@@ -251,3 +723,504 @@ def test_labels_and_kwargs_in_one_call() -> None:
     registry.clear()
     assert blk.labels == ('mylabel',)
     assert blk.attributes == {'key': 'value'}
+
+
+def test_block_deploys_skip_cdktf(tmp_path: Path) -> None:
+    """Pure Block deploys import neither cdktf, which starts Node.js, nor unused process tools."""
+    for cona in ('demo_hcl', 'foundation'):
+        (tmp_path / 'deploys' / cona / 'terraform').mkdir(parents=True)
+    loaded = check_output(  # noqa: S603
+        [
+            executable,
+            '-c',
+            (
+                'from pathlib import Path\n'
+                'from sys import modules\n'
+                'from helicopyter import multisynth\n'
+                f'multisynth(["demo_hcl", "foundation"], change_directory=Path("{tmp_path}"),'
+                ' format_with="builtin", hashicorp_configuration_language=False)\n'
+                'print(sorted({"cdktf", "concurrent.futures", "constructs", "jsii",'
+                ' "multiprocessing", "resource", "tap"} & set(modules)))'
+            ),
+        ],
+        cwd=Path(__file__).parent,
+        text=True,
+    )
+    assert loaded.splitlines()[-1] == '[]'
+
+
+def test_terraform_json() -> None:
+    terraform.backend('s3')(bucket='tf', key='cona.tfstate')
+    tlocals(cona='demo', envi=terraform.workspace)
+    provider.aws(region='us-east-1')
+    provider.aws(alias='west', region='us-west-2')
+    resource.null_resource.this(count=1, triggers={'cona': local.cona}, enabled=True)
+    variable.giha(type=string)
+    dictionary = terraform_json(registry.top_level())
+    registry.clear()
+    assert dictionary == {
+        '//': {},
+        'locals': {'cona': 'demo', 'envi': '${terraform.workspace}'},
+        'provider': {'aws': [{'region': 'us-east-1'}, {'alias': 'west', 'region': 'us-west-2'}]},
+        'resource': {
+            'null_resource': {
+                'this': {'count': '1', 'enabled': True, 'triggers': {'cona': '${local.cona}'}}
+            }
+        },
+        'terraform': {'backend': {'s3': {'bucket': 'tf', 'key': 'cona.tfstate'}}},
+        'variable': {'giha': {'type': 'string'}},
+    }
+
+
+def test_multisynth_json_without_synth(tmp_path: Path) -> None:
+    relative_path = Path('deploys') / 'demo_hcl' / 'terraform' / 'main.tf.json'
+    (tmp_path / relative_path).parent.mkdir(parents=True)
+    multisynth(
+        ['demo_hcl'],
+        change_directory=tmp_path,
+        format_with='terraform',
+        hashicorp_configuration_language=False,
+    )
+    dictionary = json_loads((tmp_path / relative_path).read_text())
+    assert dictionary['//'] == {'AUTOGENERATED': 'by helicopyter'}
+    assert dictionary['resource']['null_resource']['this']['triggers']['envi'] == '${local.envi}'
+
+
+@mark.parametrize('minify', (False, True))
+def test_json_chunks(minify: bool) -> None:  # noqa: FBT001
+    """Streamed JSON matches dumps byte for byte, including keys json must sort before encoding."""
+    value = {
+        'resource': {
+            'null_resource': {
+                f'this{index}': {'triggers': {'b': index, 'a': ['é', None, True, 1.5]}}
+                for index in (10, 9)
+            }
+        },
+        'locals': {},
+        'numbered': {10: 'ten', 9: {'nine': []}},
+        '//': {'AUTOGENERATED': 'by helicopyter'},
+    }
+    chunks = list(json_chunks(value, minify=minify))
+    assert len(chunks) > 1
+    assert ''.join(chunks) == (
+        json_dumps(value, separators=(',', ':'), sort_keys=True)
+        if minify
+        else json_dumps(value, indent=4, sort_keys=True)
+    )
+
+
+def test_multisynth_minify_json(tmp_path: Path) -> None:
+    for directory in ('indented', 'minified'):
+        (tmp_path / directory / 'deploys' / 'demo_hcl' / 'terraform').mkdir(parents=True)
+        multisynth(
+            ['demo_hcl'],
+            change_directory=tmp_path / directory,
+            format_with='builtin',
+            hashicorp_configuration_language=False,
+            minify_json=directory == 'minified',
+        )
+    relative_path = Path('deploys') / 'demo_hcl' / 'terraform' / 'main.tf.json'
+    indented = (tmp_path / 'indented' / relative_path).read_text()
+    minified = (tmp_path / 'minified' / relative_path).read_text()
+    assert indented.count('\n') > 1
+    assert minified == json_dumps(json_loads(indented), separators=(',', ':')) + '\n'
+
+
+def test_multisynth_jobs_match_serial(tmp_path: Path) -> None:
+    for directory in ('serial', 'parallel'):
+        for cona in ('classdemo', 'demo'):
+            (tmp_path / directory / 'deploys' / cona / 'terraform').mkdir(parents=True)
+    for directory, jobs in (('serial', 1), ('parallel', 2)):
+        multisynth(
+            ['classdemo', 'demo'],
+            change_directory=tmp_path / directory,
+            format_with='terraform',
+            hashicorp_configuration_language=False,
+            jobs=jobs,
+        )
+    for cona in ('classdemo', 'demo'):
+        relative_path = Path('deploys') / cona / 'terraform' / 'main.tf.json'
+        assert (tmp_path / 'serial' / relative_path).read_bytes() == (
+            tmp_path / 'parallel' / relative_path
+        ).read_bytes()
+
+
+@mark.parametrize('jobs', (1, 2))
+def test_multisynth_profile(tmp_path: Path, jobs: int) -> None:
+    for cona in ('demo_hcl', 'foundation'):
+        (tmp_path / 'deploys' / cona / 'terraform').mkdir(parents=True)
+    multisynth(
+        ['demo_hcl', 'foundation'],
+        change_directory=tmp_path,
+        format_with='builtin',
+        hashicorp_configuration_language=True,
+        jobs=jobs,
+        profile=tmp_path / 'profile.json',
+    )
+    phases = json_loads((tmp_path / 'profile.json').read_text())['phases']
+    assert [(entry['cona'], entry['phase']) for entry in phases] == [
+        (cona, phase)
+        for cona in ('demo_hcl', 'foundation')
+        for phase in ('import', 'render', 'format', 'write')
+    ]
+    assert phases[0]['blocks'] == 3
+    assert all(entry['wall_seconds'] > 0 and entry['peak_bytes'] > 0 for entry in phases)
+
+
+@mark.parametrize(('platform', 'scale'), (('darwin', 1), ('freebsd14', 1024)))
+def test_peak_bytes_without_proc(monkeypatch: MonkeyPatch, platform: str, scale: int) -> None:
+    """ru_maxrss is in bytes on macOS and kilobytes elsewhere."""
+    monkeypatch.setattr('helicopyter.profile.status_kilobytes', lambda *_: None)
+    monkeypatch.setattr('helicopyter.profile.platform', platform)
+    monkeypatch.setattr('resource.getrusage', lambda _: SimpleNamespace(ru_maxrss=1000))
+    assert peak_bytes() == 1000 * scale
+
+
+def test_serve(tmp_path: Path, capsys: CaptureFixture[str], monkeypatch: MonkeyPatch) -> None:
+    """The daemon reruns edited deploys with the client's environment, until it stops."""
+    main = tmp_path / 'deploys' / 'served' / 'terraform' / 'main.py'
+    main.parent.mkdir(parents=True)
+    (tmp_path / 'deploys' / '__init__.py').touch()
+    arguments = {
+        'all_or_conas_or_paths': ['served'],
+        'change_directory': None,
+        'format_with': 'builtin',
+        'hashicorp_configuration_language': True,
+    }
+    assert request(tmp_path, arguments) is None
+    daemon = Popen(  # noqa: S603
+        [executable, '-m', 'helicopyter', 'serve', '-C', str(tmp_path)],
+        env=environ | {'PYTHONPATH': str(Path(__file__).parent)},
+        stdout=PIPE,
+        text=True,
+    )
+    try:
+        assert daemon.stdout
+        assert daemon.stdout.readline().startswith('Serving')
+        for version in (1, 2):
+            main.write_text(f'from helicopyter import tlocals\n\ntlocals(version={version})\n')
+            assert request(tmp_path, arguments) == 0
+            assert f'version = "{version}"' in main.with_suffix('.tf').read_text()
+        assert 'Wrote 1 files' in capsys.readouterr().out
+        main.write_text(
+            'from os import environ\nfrom helicopyter import tlocals\n\n'
+            "tlocals(region=environ['SERVED_REGION'])\n"
+        )
+        monkeypatch.setenv('SERVED_REGION', 'client')
+        assert request(tmp_path, arguments) == 0
+        assert 'region = "client"' in main.with_suffix('.tf').read_text()
+        assert request(tmp_path, arguments | {'all_or_conas_or_paths': ['missing']}) == 1
+        assert 'ModuleNotFoundError' in capsys.readouterr().out
+    finally:
+        daemon.send_signal(SIGINT)
+        daemon.wait()
+    assert request(tmp_path, arguments) is None
+
+
+def test_select_conas_affected(tmp_path: Path) -> None:
+    """Codenames are selected by what their deploy directory and transitive imports include."""
+    for relative_path, source in (
+        ('deploys/__init__.py', ''),
+        ('deploys/buddies/__init__.py', ''),
+        ('deploys/buddies/members.py', 'members = []\n'),
+        ('deploys/buddies/terraform/main.py', 'from deploys.buddies.members import members\n'),
+        ('deploys/based/terraform/main.py', 'from stacks.base import r2_backend\n'),
+        ('deploys/plain/terraform/main.py', 'from helicopyter import tlocals\n'),
+        ('stacks/base.py', 'from stacks.backend import r2_backend\n'),
+        ('stacks/backend.py', 'r2_backend = None\n'),
+    ):
+        (tmp_path / relative_path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / relative_path).write_text(source)
+    for command in (
+        ['init', '--quiet'],
+        ['add', '.'],
+        ['-c', 'user.email=test@example.com', '-c', 'user.name=Test', 'commit', '-qm', '.'],
+    ):
+        check_output(['git', *command], cwd=tmp_path)  # noqa: S603
+    assert select_conas(['affected:HEAD'], tmp_path) == []
+    (tmp_path / 'stacks' / 'backend.py').write_text('r2_backend = 1\n')
+    assert select_conas(['affected:HEAD'], tmp_path) == ['based']
+    assert select_conas(['affected:HEAD', 'plain'], tmp_path) == ['based', 'plain']
+    (tmp_path / 'deploys' / 'plain' / 'terraform' / 'variables.tf').touch()
+    assert select_conas(['affected:HEAD'], tmp_path) == ['based', 'plain']
+    assert select_conas([str(tmp_path / 'deploys' / 'buddies' / 'members.py')], tmp_path) == [
+        'buddies'
+    ]
+    # Relative paths are relative to top_directory, not the working directory
+    assert select_conas(['deploys/buddies/members.py'], tmp_path) == ['buddies']
+    assert select_conas(['deploys/plain/terraform/main.py', 'stacks/base.py'], tmp_path) == [
+        'based',
+        'plain',
+    ]
+
+
+@mark.parametrize('waiter', (inotify_waiter, polling_waiter))
+def test_watch_waiter(tmp_path: Path, waiter: Callable[[Path], Wait | None]) -> None:
+    (tmp_path / 'edited.py').touch()
+    wait = waiter(tmp_path)
+    assert wait
+    assert wait(0.3) == set()
+    (tmp_path / 'edited.py').write_text('edited = True\n')
+    (tmp_path / 'ignored.txt').touch()
+    (tmp_path / 'added').mkdir()
+    (tmp_path / 'added' / 'new.py').touch()
+    assert next(debounced(wait)) == {tmp_path / 'edited.py', tmp_path / 'added' / 'new.py'}
+
+
+def test_watch(tmp_path: Path) -> None:
+    """Only codenames importing a changed file are synthesized again, with the change."""
+    (tmp_path / 'deploys').mkdir()
+    (tmp_path / 'deploys' / '__init__.py').touch()
+    (tmp_path / 'shared.py').write_text('version = 1\n')
+    for cona, source in (('sharing', 'from shared import version'), ('unshared', 'version = 1')):
+        main = tmp_path / 'deploys' / cona / 'terraform' / 'main.py'
+        main.parent.mkdir(parents=True)
+        main.write_text(f'from helicopyter import tlocals\n{source}\n\ntlocals(version=version)\n')
+    daemon = Popen(
+        [executable, '-m', 'helicopyter', '--format_with', 'builtin', '--watch', 'all'],
+        cwd=tmp_path,
+        env=environ | {'PYTHONPATH': str(Path(__file__).parent)},
+        stdout=PIPE,
+        text=True,
+    )
+    # Ends the output, failing the test instead of hanging it
+    timer = Timer(60, daemon.kill)
+    timer.start()
+    try:
+        assert daemon.stdout
+        lines = iter(daemon.stdout.readline, '')
+        assert 'Wrote 2 files; 0 unchanged\n' in lines
+        (tmp_path / 'shared.py').write_text('version = 2\n')
+        assert 'Generating deploys/sharing/terraform/main.tf\n' in lines
+        assert next(lines) == 'Wrote 1 files; 0 unchanged\n'
+    finally:
+        timer.cancel()
+        daemon.send_signal(SIGINT)
+        daemon.wait()
+    assert 'version = "2"' in (tmp_path / 'deploys/sharing/terraform/main.tf').read_text()
+    assert 'version = "1"' in (tmp_path / 'deploys/unshared/terraform/main.tf').read_text()
+
+
+def test_multisynth_sharded_counts_each_file(tmp_path: Path) -> None:
+    """Summaries, --check, and --cache cover every shard's main.tf, not only the first."""
+    (tmp_path / 'deploys').mkdir()
+    (tmp_path / 'deploys' / '__init__.py').touch()
+    main = tmp_path / 'deploys' / 'sharded' / 'terraform' / 'main.py'
+    main.parent.mkdir(parents=True)
+    main.write_text(
+        'from helicopyter import resource\n'
+        'from helicopyter.sharding import by_type as shard\n\n'
+        'resource.random_id.b(byte_length=4)\n'
+        "resource.null_resource.a(triggers={'id': resource.random_id.b.hex})\n"
+    )
+
+    def helicopyter(*args: str) -> str:
+        return run(  # noqa: S603
+            [executable, '-m', 'helicopyter', '--format_with', 'builtin', *args, 'all'],
+            capture_output=True,
+            check=False,
+            cwd=tmp_path,
+            env=environ | {'PYTHONPATH': str(Path(__file__).parent)},
+            text=True,
+        ).stdout
+
+    assert 'Wrote 3 files; 0 unchanged\n' in helicopyter('--cache')
+    shard = tmp_path / 'deploys' / 'sharded' / 'terraform' / 'random_id' / 'main.tf'
+    shard.write_text(shard.read_text() + '# edited\n')
+    assert '1 files out of date; 2 up to date\n' in helicopyter('--check')
+    assert 'Wrote 1 files; 2 unchanged\n' in helicopyter('--cache')
+
+
+def test_multisynth_jobs_report_each_failure(tmp_path: Path) -> None:
+    with raises(ExceptionGroup) as group:
+        multisynth(
+            ['missing1', 'missing2'],
+            change_directory=tmp_path,
+            format_with='terraform',
+            hashicorp_configuration_language=True,
+            jobs=2,
+        )
+    assert sorted(error.__notes__[-1] for error in group.value.exceptions) == [
+        'while generating missing1',
+        'while generating missing2',
+    ]
+
+
+def test_cache_fingerprint(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    """Imported local modules, missing optional modules, and read variables are inputs."""
+    main = tmp_path / 'deploys' / 'cona' / 'terraform' / 'main.py'
+    main.parent.mkdir(parents=True)
+    main.write_text(
+        'from os import environ\n'
+        'from stacks.base import r2_backend\n'
+        'try:\n'
+        '    from stacks.optional import extra\n'
+        'except ImportError:\n'
+        '    pass\n'
+        "region = environ.get('REGION')\n"
+    )
+    (tmp_path / 'stacks').mkdir()
+    (tmp_path / 'stacks' / 'base.py').write_text('def r2_backend(): pass\n')
+    (tmp_path / 'unrelated.py').write_text('')
+    monkeypatch.delenv('REGION', raising=False)
+    original = fingerprint(tmp_path, 'cona', {})
+
+    (tmp_path / 'unrelated.py').write_text('changed = True\n')
+    assert fingerprint(tmp_path, 'cona', {}) == original
+    assert fingerprint(tmp_path, 'cona', {'format_with': 'tofu'}) != original
+
+    monkeypatch.setenv('REGION', 'auto')
+    assert fingerprint(tmp_path, 'cona', {}) != original
+    monkeypatch.delenv('REGION')
+
+    (tmp_path / 'stacks' / 'optional.py').write_text('extra = 1\n')
+    assert fingerprint(tmp_path, 'cona', {}) != original
+    (tmp_path / 'stacks' / 'optional.py').unlink()
+
+    (tmp_path / 'stacks' / 'base.py').write_text('def r2_backend(): return None\n')
+    assert fingerprint(tmp_path, 'cona', {}) != original
+
+
+def test_cache_is_fresh_checks_output(tmp_path: Path) -> None:
+    (tmp_path / 'main.tf').write_text('locals {}\n')
+    (tmp_path / 'shard').mkdir()
+    (tmp_path / 'shard' / 'main.tf').write_text('locals {}\n')
+    entry = record(tmp_path, 'abc', ['main.tf', 'shard/main.tf'])
+    assert is_fresh(tmp_path, entry, 'abc')
+    assert not is_fresh(tmp_path, entry, 'def')
+    assert not is_fresh(tmp_path, None, 'abc')
+    (tmp_path / 'shard' / 'main.tf').write_text('locals {}\n# edited\n')
+    assert not is_fresh(tmp_path, entry, 'abc')
+
+
+def test_multisynth_cache_skips_unchanged(tmp_path: Path, capsys: CaptureFixture[str]) -> None:
+    (tmp_path / 'deploys' / 'demo' / 'terraform').mkdir(parents=True)
+    for _ in range(2):
+        multisynth(
+            ['demo'],
+            cache=True,
+            change_directory=tmp_path,
+            format_with='terraform',
+            hashicorp_configuration_language=False,
+        )
+    assert capsys.readouterr().out.count('Generating deploys/demo/terraform/main.tf.json') == 1
+
+
+def test_multisynth_check(tmp_path: Path, capsys: CaptureFixture[str]) -> None:
+    relative_path = Path('deploys') / 'demo' / 'terraform' / 'main.tf.json'
+    (tmp_path / relative_path).parent.mkdir(parents=True)
+    options = {
+        'change_directory': tmp_path,
+        'format_with': 'terraform',
+        'hashicorp_configuration_language': False,
+    }
+    assert multisynth(['demo'], check=True, **options) == 1
+    assert not (tmp_path / relative_path).exists()
+    assert multisynth(['demo'], **options) == 1
+    assert multisynth(['demo'], check=True, **options) == 0
+    generated = (tmp_path / relative_path).read_text()
+    (tmp_path / relative_path).write_text(generated.replace('"demo"', '"stale"'))
+    capsys.readouterr()
+    assert multisynth(['demo'], check=True, **options) == 1
+    out = capsys.readouterr().out
+    assert f'--- a/{relative_path}\n+++ b/{relative_path}\n' in out
+    assert '-        "cona": "stale",\n+        "cona": "demo",\n' in out
+    assert '1 files out of date; 0 up to date' in out
+    assert '"stale"' in (tmp_path / relative_path).read_text()
+
+
+def test_diff(tmp_path: Path, capsys: CaptureFixture[str]) -> None:
+    old = tmp_path / 'old.tf'
+    old.write_text(
+        '# AUTOGENERATED by helicopyter\n\n'
+        'locals {\n  cona = "demo"\n  envi = terraform.workspace\n}\n\n'
+        'provider "aws" {\n  alias  = "west"\n  region = "us-west-2"\n}\n\n'
+        'resource "null_resource" "this" {\n  triggers = {\n    cona = local.cona\n  }\n}\n\n'
+        'variable "giha" {\n  type = string\n}\n'
+    )
+    new = tmp_path / 'new.tf'
+    new.write_text(
+        '# AUTOGENERATED by helicopyter\n\n'
+        'locals {\n  cona        = "demo"\n  environment = terraform.workspace\n}\n\n'
+        'provider "aws" {\n  alias  = "west"\n  region = "us-west-2"\n}\n\n'
+        'resource "null_resource" "this" {\n  triggers = {\n    cona = "demo"\n  }\n'
+        '  lifecycle {\n    ignore_changes = [triggers]\n  }\n}\n\n'
+        'data "aws_iam_policy_document" "this" {\n  json = <<EOT\n{}\n}\nEOT\n}\n'
+    )
+    assert compare(old, new)
+    assert capsys.readouterr().out == (
+        '~ locals\n'
+        '    - envi = terraform.workspace\n'
+        '    + environment = terraform.workspace\n'
+        '~ resource.null_resource.this\n'
+        '    - triggers = {\n'
+        '    -   cona = local.cona\n'
+        '    - }\n'
+        '    + triggers = {\n'
+        '    +   cona = "demo"\n'
+        '    + }\n'
+        '    + lifecycle {\n'
+        '    +   ignore_changes = [triggers]\n'
+        '    + }\n'
+        '- variable.giha\n'
+        '+ data.aws_iam_policy_document.this\n'
+        '1 added, 1 removed, 2 changed blocks\n'
+    )
+    policy = read_index(new)['data.aws_iam_policy_document.this']
+    assert policy == {'json': 'json = <<EOT\n{}\n}\nEOT'}
+    assert not compare(new, new)
+
+    old_json = tmp_path / 'old.tf.json'
+    old_json.write_text(
+        json_dumps(
+            {
+                '//': {'AUTOGENERATED': 'by helicopyter'},
+                'provider': {'aws': [{'region': 'us-east-1'}, {'alias': 'west', 'region': 'w'}]},
+                'resource': {'null_resource': {'this': {'triggers': {'cona': 'demo'}}}},
+            }
+        )
+    )
+    new_json = tmp_path / 'new.tf.json'
+    new_json.write_text(
+        json_dumps(
+            {
+                'provider': {'aws': [{'region': 'us-east-2'}, {'alias': 'west', 'region': 'w'}]},
+                'resource': {'null_resource': {'this': {'triggers': {'cona': 'demo'}}}},
+            }
+        )
+    )
+    assert list(read_index(old_json)) == [
+        'provider.aws',
+        'provider.aws.west',
+        'resource.null_resource.this',
+    ]
+    assert diff(read_index(old_json), read_index(new_json)) == [
+        '~ provider.aws',
+        '    - region = "us-east-1"',
+        '    + region = "us-east-2"',
+    ]
+
+
+def test_write_if_changed_keeps_unchanged_mtime(tmp_path: Path) -> None:
+    path = tmp_path / 'main.tf'
+    assert write_if_changed(path, ['locals {}', '\n'])
+    mtime = path.stat().st_mtime_ns
+    assert not write_if_changed(path, ['locals {}\n'])
+    assert path.stat().st_mtime_ns == mtime
+    assert write_if_changed(path, ['locals {', '\n}\n'])
+    assert path.read_text() == 'locals {\n}\n'
+    assert [file.name for file in tmp_path.iterdir()] == ['main.tf']
+
+
+def test_write_if_changed_failure_keeps_original(tmp_path: Path) -> None:
+    path = tmp_path / 'main.tf'
+    path.write_text('original\n')
+
+    def chunks() -> Iterator[str]:
+        yield 'partial'
+        raise ValueError('rendering failed')
+
+    with raises(ValueError, match='rendering failed'):
+        write_if_changed(path, chunks())
+    assert path.read_text() == 'original\n'
+    assert [file.name for file in tmp_path.iterdir()] == ['main.tf']